@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+
+try:
+    import fcntl
+except ImportError:  # Windows: no multi-process mode there, so the thread lock is enough
+    fcntl = None
+
+# --- 1. CONFIGURATION ---
+FLUSH_EVERY = 64  # buffered lookups written per append
+MAX_BYTES = int(os.environ.get("ECOSCAN_ACCESS_LOG_MAX_BYTES", str(4 * 1024 * 1024)))  # then rotated to <path>.1
+MAX_BUFFERED = 10000  # in-memory history kept when there is no log file
+
+
+# --- 2. APPEND-ONLY LOOKUP LOG ---
+# One "<epoch seconds> <barcode>" line per product lookup. Lines are buffered and
+# appended in batches, so recording a lookup is a deque append. With an empty path
+# nothing is written and only the last MAX_BUFFERED lookups are remembered.
+# Several processes may share one log (see multiworker.py): each append and rotation
+# happens under an flock on <path>.lock, so two processes never rotate at once and
+# overwrite each other's <path>.1.
+class AccessLog:
+    def __init__(self, path, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._pending = deque(maxlen=None if path else MAX_BUFFERED)
+        self._lock = threading.Lock()
+        self.recorded = 0
+
+    def record(self, barcode):
+        with self._lock:
+            self._pending.append((time.time(), barcode))
+            self.recorded += 1
+            if self.path and len(self._pending) >= FLUSH_EVERY:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            if self.path:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        lines = "".join(f"{ts:.0f} {barcode}\n" for ts, barcode in self._pending)
+        self._pending.clear()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path + ".lock", "a") as lock_fh:
+                if fcntl is not None:
+                    fcntl.flock(lock_fh, fcntl.LOCK_EX)  # released when lock_fh is closed
+                with open(self.path, "a", encoding="utf-8") as fh:
+                    fh.write(lines)
+                    size = fh.tell()
+                if size > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+        except OSError:
+            pass  # the log only feeds warm-up; losing a batch is harmless
+
+    def _iter_entries(self):
+        if self.path:
+            for path in (self.path + ".1", self.path):
+                try:
+                    with open(path, encoding="utf-8") as fh:
+                        for line in fh:
+                            ts, _, barcode = line.rstrip("\n").partition(" ")
+                            try:
+                                yield float(ts), barcode
+                            except ValueError:
+                                continue  # torn or foreign line
+                except FileNotFoundError:
+                    continue
+        with self._lock:
+            pending = list(self._pending)
+        yield from pending
+
+    def top(self, n, window_seconds):
+        # The n barcodes looked up most often in the last window_seconds
+        since = time.time() - window_seconds
+        counts = Counter(barcode for ts, barcode in self._iter_entries() if ts >= since and barcode)
+        return [barcode for barcode, _ in counts.most_common(n)]
+
+    def stats(self):
+        with self._lock:
+            return {"path": self.path or None, "recorded": self.recorded, "pending": len(self._pending)}
@@ -0,0 +1,241 @@
+"""Headless HTTP API over the EcoScan core, for POS scanners and mobile clients.
+
+    python api_server.py --port 8000
+    python api_server.py --port 8000 --processes 4   # Linux/macOS: 4 forked workers on one port
+
+    GET  /v1/products/<barcode>            scored product
+    GET  /v1/products/<barcode>/alternatives   greener products in the same category (needs the offline index)
+    POST /v1/products/batch                {"barcodes": [...]} -> one result per barcode
+    POST /v1/compare                       {"barcodes": [...]} -> ranked by carbon footprint
+    GET  /v1/reports/<barcode>.pdf         single-product PDF report
+    POST /v1/reports/basket                {"barcodes": [...]} -> multi-page PDF report
+    GET  /v1/stats                         cache, client and timing counters
+
+Lookups run on off_client's fetch pool and product cache, the same ones the
+Streamlit app uses when both are served from one process. With --processes the
+workers share the listening socket and the on-disk product cache, so PDF and JSON
+work spreads over several cores and a product fetched by one worker is a hit for all.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.process
+import tornado.web
+
+import instrumentation
+from ecoscan_core import (
+    _get_report_fields,
+    generate_pdf_bytes,
+    lookup_product,
+    rank_comparison,
+    recommend_alternatives,
+    generate_basket_pdf_bytes,
+)
+from off_client import ProductAPIError, access_log, cache_stats, client_stats, fetch_product, get_executor
+from warmup import start_warmup, warmup_stats
+
+MAX_BATCH_SIZE = int(os.environ.get("ECOSCAN_API_MAX_BATCH", "500"))
+# GTIN/EAN/UPC codes are digits only; anything else never reaches upstream or the access log
+BARCODE_RE = re.compile(r"[0-9]+")
+
+
+# --- 1. HELPERS ---
+def _run_fetch(func, *args):
+    # Lookups block on the network or disk, so they go to the shared fetch pool
+    return tornado.ioloop.IOLoop.current().run_in_executor(get_executor(), func, *args)
+
+
+def _run_cpu(func, *args):
+    # PDF rendering stays off both the event loop and the fetch pool
+    return tornado.ioloop.IOLoop.current().run_in_executor(None, func, *args)
+
+
+def _fetch_outcome(barcode):
+    # (barcode, product, error), the same shape off_client.iter_products yields
+    try:
+        return barcode, fetch_product(barcode), None
+    except ProductAPIError as exc:
+        return barcode, None, exc
+
+
+async def _fetch_all(barcodes):
+    return await asyncio.gather(*[_run_fetch(_fetch_outcome, barcode) for barcode in barcodes])
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def set_default_headers(self):
+        self.set_header("X-EcoScan-Worker", str(os.getpid()))  # which process answered, with --processes
+
+    def write_json(self, payload, status=200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(payload))
+
+    def write_error(self, status_code, **kwargs):
+        self.write_json({"error": self._reason}, status=status_code)
+
+    def check_barcode(self, barcode):
+        if not BARCODE_RE.fullmatch(barcode):
+            raise tornado.web.HTTPError(400, reason="Barcodes must be digits only")
+        return barcode
+
+    def barcodes_from_body(self):
+        try:
+            body = json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Body must be JSON")
+        barcodes = body.get("barcodes") if isinstance(body, dict) else None
+        if not isinstance(barcodes, list) or not all(isinstance(b, str) and b for b in barcodes):
+            raise tornado.web.HTTPError(400, reason='Expected {"barcodes": ["<barcode>", ...]}')
+        if len(barcodes) > MAX_BATCH_SIZE:
+            raise tornado.web.HTTPError(413, reason=f"At most {MAX_BATCH_SIZE} barcodes per request")
+        for barcode in barcodes:
+            self.check_barcode(barcode)
+        return list(dict.fromkeys(barcodes))  # drop duplicates, keep order
+
+
+# --- 2. ENDPOINTS ---
+class ProductHandler(BaseHandler):
+    async def get(self, barcode):
+        self.check_barcode(barcode)
+        status, payload = await _run_fetch(lookup_product, barcode)
+        if status == "ok":
+            self.write_json(payload)
+        elif status == "not_found":
+            self.write_json({"error": f"Product {barcode} not found"}, status=404)
+        else:
+            self.write_json({"error": payload}, status=502)
+
+
+class AlternativesHandler(BaseHandler):
+    async def get(self, barcode):
+        self.check_barcode(barcode)
+        try:
+            limit = int(self.get_query_argument("limit", "5"))
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="limit must be an integer")
+        if limit < 1:
+            raise tornado.web.HTTPError(400, reason="limit must be at least 1")
+        limit = min(limit, MAX_BATCH_SIZE)
+        try:
+            prod = await _run_fetch(fetch_product, barcode)
+        except ProductAPIError as exc:
+            raise tornado.web.HTTPError(502, reason=str(exc))
+        if prod is None:
+            raise tornado.web.HTTPError(404, reason=f"Product {barcode} not found")
+        alternatives = await _run_fetch(recommend_alternatives, barcode, prod, limit)
+        self.write_json({"barcode": barcode, "alternatives": alternatives})
+
+
+class BatchHandler(BaseHandler):
+    async def post(self):
+        barcodes = self.barcodes_from_body()
+        lookups = await asyncio.gather(*[_run_fetch(lookup_product, barcode) for barcode in barcodes])
+        results = []
+        for barcode, (status, payload) in zip(barcodes, lookups):
+            if status == "ok":
+                results.append({"barcode": barcode, "status": status, "product": payload})
+            elif status == "not_found":
+                results.append({"barcode": barcode, "status": status})
+            else:
+                results.append({"barcode": barcode, "status": status, "error": payload})
+        self.write_json({"results": results})
+
+
+class CompareHandler(BaseHandler):
+    async def post(self):
+        barcodes = self.barcodes_from_body()
+        self.write_json(rank_comparison(barcodes, await _fetch_all(barcodes)))
+
+
+class ProductReportHandler(BaseHandler):
+    async def get(self, barcode):
+        self.check_barcode(barcode)
+        try:
+            prod = await _run_fetch(fetch_product, barcode)
+        except ProductAPIError as exc:
+            raise tornado.web.HTTPError(502, reason=str(exc))
+        if prod is None:
+            raise tornado.web.HTTPError(404, reason=f"Product {barcode} not found")
+        with instrumentation.span("report.pdf"):
+            pdf_bytes = await _run_cpu(generate_pdf_bytes, *_get_report_fields(barcode, prod))
+        self.set_header("Content-Type", "application/pdf")
+        self.set_header("Content-Disposition", f'attachment; filename="EcoScan_Report_{barcode}.pdf"')
+        self.finish(pdf_bytes)
+
+
+class BasketReportHandler(BaseHandler):
+    async def post(self):
+        barcodes = self.barcodes_from_body()
+        found = {barcode: prod for barcode, prod, _ in await _fetch_all(barcodes) if prod is not None}
+        if not found:
+            raise tornado.web.HTTPError(404, reason="None of the barcodes were found")
+        rows = (_get_report_fields(barcode, found[barcode]) for barcode in barcodes if barcode in found)
+        with instrumentation.span("report.basket_pdf"):
+            pdf_bytes = await _run_cpu(generate_basket_pdf_bytes, rows)
+        self.set_header("Content-Type", "application/pdf")
+        self.set_header("Content-Disposition", 'attachment; filename="EcoScan_Basket_Report.pdf"')
+        self.finish(pdf_bytes)
+
+
+class StatsHandler(BaseHandler):
+    def get(self):
+        self.write_json({
+            "cache": cache_stats(),
+            "client": client_stats(),
+            "warmup": warmup_stats(),
+            "access_log": access_log.stats(),
+            "spans": instrumentation.snapshot(),
+            "pid": os.getpid(),
+        })
+
+
+def make_app():
+    return tornado.web.Application([
+        (r"/v1/products/batch", BatchHandler),
+        (r"/v1/products/([^/]+)/alternatives", AlternativesHandler),
+        (r"/v1/products/([^/]+)", ProductHandler),
+        (r"/v1/compare", CompareHandler),
+        (r"/v1/reports/basket", BasketReportHandler),
+        (r"/v1/reports/([^/]+)\.pdf", ProductReportHandler),
+        (r"/v1/stats", StatsHandler),
+    ])
+
+
+# --- 3. ENTRY POINT ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the EcoScan scoring API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--processes", type=int, default=1, help="worker processes sharing the port (0: one per core)")
+    args = parser.parse_args(argv)
+
+    sockets, task_id = None, 0
+    if args.processes != 1:
+        # Bound before forking so every worker accepts on the same socket; each builds its
+        # cache, fetch pool and event loop after the fork. A worker that dies is restarted.
+        sockets = tornado.netutil.bind_sockets(args.port, address=args.host)
+        task_id = tornado.process.fork_processes(args.processes, max_restarts=100)
+    # One warmer is enough: it fills the disk cache the other workers read
+    asyncio.run(serve(args.host, args.port, sockets, warm=task_id == 0))
+
+
+async def serve(host, port, sockets=None, warm=True):
+    if sockets is None:
+        make_app().listen(port, address=host)
+    else:
+        tornado.httpserver.HTTPServer(make_app()).add_sockets(sockets)
+    if warm:
+        start_warmup()  # ECOSCAN_WARMUP_BARCODES plus the most requested barcodes
+    print(f"EcoScan API listening on http://{host}:{port} (pid {os.getpid()})")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,29 @@
 import streamlit as st
-import requests
-import plotly.graph_objects as go
-from PIL import Image
-from pyzbar.pyzbar import decode
-from fpdf import FPDF
-import base64
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import time
 import json
 import math
+import os
+import sys
+import tempfile
+
+# plotly, fpdf, pyzbar/PIL and requests are imported where first needed, not here,
+# so the first page render does not wait for them (see benchmarks/bench_startup.py)
+import instrumentation
+from ecoscan_core import (
+    _get_carbon_footprint,
+    _get_eco_grade_details,
+    _get_ecoscore,
+    _get_report_fields,
+    generate_pdf_bytes,
+    recommend_alternatives,
+    generate_basket_pdf_bytes,
+)
+from off_client import ProductAPIError, access_log, cache_stats, client_stats, fetch_product, iter_products
+from session_memory import enforce_budget, sessions, shared_blobs
+from ui_styles import CUSTOM_CSS_HTML
+from warmup import start_warmup, warmup_stats
 
 # --- 1. CONFIGURATION / CONSTANTS ---
 PAGE_TITLE = "EcoShop - Sustainable Shopping Assistant"
@@ -18,130 +34,20 @@ DEMO_BARCODES_MAP = {
     "Dairy Milk": "7622201762063",
     "Masala Oats": "8901088068734"
 }
+DEFAULT_COMPARISON_BARCODES = ["3017620429484", "8901058001181"]
+COMPARISON_REFRESH_SECONDS = 0.25 # Minimum time between intermediate comparison redraws
+DEBUG_ENV_ENABLED = os.environ.get("ECOSCAN_DEBUG") == "1" # Debug panel is also reachable with ?debug=1
+# Per-session memos, in the order they are dropped when a session goes over its memory budget:
+# the first two rebuild themselves from the product cache, the last two need another button press
+SESSION_MEMO_KEYS = ("scanned_overview", "product_view", "comparison", "basket_import")
+# Largest per-item results CSV kept in memory for download; scoring itself streams, but
+# this file grows with the basket (basket_import.py --output has no such limit)
+BASKET_ITEMS_CSV_MAX_BYTES = int(os.environ.get("ECOSCAN_BASKET_CSV_MAX_BYTES", str(8 * 1024 * 1024)))
 
 # --- 2. CSS STYLES ---
 def apply_custom_css():
-    st.markdown("""
-        <style>
-            /* 1. Overall Page & App Container: Ensure no page-level scrolling */
-            html, body, .stApp {
-                height: 100vh; /* Make it fill the entire viewport height */
-                width: 100vw;  /* Make it fill the entire viewport width */
-                margin: 0;
-                padding: 0;
-                overflow: hidden; /* CRUCIAL: Prevents scrollbars on the html/body/main app itself */
-                display: flex;
-                flex-direction: column; /* Stack children vertically */
-            }
-
-            /* Hide Streamlit default header/footer if any, to reclaim space */
-            header, footer {
-                visibility: hidden;
-                height: 0;
-                margin: 0;
-                padding: 0;
-            }
-
-            /* 2. Main Content Block: The area after the title, before the tab content */
-            .block-container {
-                flex-grow: 1; /* Allow it to take all remaining vertical space within .stApp */
-                height: 100%; /* IMPORTANT: It needs a defined height for its flex children */
-                max-width: 95vw; /* Keep consistent width constraint */
-                overflow: hidden; /* No scrolling for this main block either */
-                display: flex;
-                flex-direction: column; /* Stack title, tabs, and tab-content area */
-                padding-top: 0.5rem; /* Reduced top padding */
-            }
-
-            /* Adjust title and tabs to take their space without growing/shrinking */
-            h1 {
-                margin: 0px; /* Remove default margins */
-                flex-shrink: 0;
-                # padding-bottom: 0.5rem; /* Add some space below title */
-            }
-            [data-testid="stTabs"] {
-                flex-shrink: 0;
-                margin-bottom: 0; /* Adjust margin below tabs */
-            }
-
-            /* 3. Tab Panel Content: The area inside the selected tab (contains the columns) */
-            div[role="tabpanel"] {
-                flex-grow: 1; /* Make tab content fill remaining height within block-container */
-                height: 100%; /* IMPORTANT: Must have defined height for its column children */
-                display: flex; /* Make it a flex container for the columns */
-                flex-direction: row; /* Layout columns horizontally */
-                overflow: hidden; /* No scrolling for the tab panel itself */
-                padding: 0 1rem; /* Adjust horizontal padding */
-            }
-
-            /* 4. Streamlit Columns: Ensure columns take full height and are flex containers */
-            [data-testid="stColumn"] {
-                display: flex;
-                flex-direction: column; /* Stack content within columns vertically */
-                flex-grow: 1; /* Allow columns to expand to fill horizontal space */
-                height: 100%; /* IMPORTANT: Makes column take full height of its tabpanel parent */
-                overflow: hidden; /* No scrolling for the column container itself */
-            }
-
-            /* 5. CRUCIAL: The actual scrollable content block within the RIGHT column */
-            /* This targets the `stVerticalBlock` div, which is the direct parent of your st.elements
-               within each column. We want *this* element to scroll if its content overflows. */
-            [data-testid="stColumn"]:nth-of-type(2) > div:first-child > [data-testid="stVerticalBlock"] {
-                flex-grow: 1; /* Allow this content block to take available vertical space */
-                overflow-y: auto; /* FINALLY, make THIS area scrollable */
-                padding-right: 1rem; /* Add padding for scrollbar visibility */
-                padding-left: 1rem; /* Add some left padding to match general UI */
-                min-height: 0; /* Essential for flex-grow to work correctly with overflow:auto */
-            }
-            /* Adjust padding/margin for `stVerticalBlock` within the left column as well, if needed */
-            [data-testid="stColumn"]:nth-of-type(1) > div:first-child > [data-testid="stVerticalBlock"] {
-                padding-right: 1rem;
-                padding-left: 1rem;
-            }
-
-
-            /* Adjust Plotly charts to fill available space without causing overflow */
-            .stPlotlyChart {
-                height: auto !important; /* Allow plotly chart to determine its height based on content */
-                max-height: 400px; /* Set a maximum height to prevent excessively tall charts */
-                min-height: 250px; /* Ensure a minimum size for visibility */
-                width: 100% !important; /* Fill parent width */
-                margin: 0px !important; /* Remove all default margins around the chart */
-                padding: 0px !important; /* Remove all default paddings around the chart */
-                border: 1px solid #e0e0e0; /* Add a subtle border to the chart */
-                border-radius: 5px; /* Slightly rounded corners for the border */
-            }
-
-            /* Adjust margins/padding for various Streamlit elements for a tighter layout */
-            .stMarkdown, .stSubheader, .stTextInput, .stFileUploader, .stSelectbox,
-            .stButton, .stMetric, .stProgress, .stSuccess, .stInfo, .stWarning, .stError,
-            div[data-testid="stHorizontalBlock"] {
-                margin-bottom: 0.2rem !important; /* Reduced margin */
-                margin-top: 0.2rem !important;    /* Reduced margin */
-                padding-top: 0.2rem !important;   /* Reduced padding */
-                padding-bottom: 0.2rem !important;/* Reduced padding */
-            }
-
-            /* Specific adjustment for subheaders to control space */
-            .stSubheader {
-                margin-top: 0.5rem !important; /* Slightly more space above subheaders */
-                margin-bottom: 0.2rem !important; /* Less space below subheaders */
-            }
-
-            /* Specific adjustment for the HR line (st.write("---")) */
-            hr {
-                margin-top: 0.3rem !important; /* Reduce space above HR */
-                margin-bottom: 0.3rem !important; /* Reduce space below HR */
-                border-top: 1px solid #eee; /* Lighten HR line if needed */
-            }
-
-            /* Adjust spacing for metrics */
-            div[data-testid="stMetric"] {
-                padding: 0.5rem !important;
-                margin-bottom: 0.5rem !important;
-            }
-        </style>
-    """, unsafe_allow_html=True)
+    # Built once in ui_styles (not on every rerun); only the finished <style> tag is sent
+    st.markdown(CUSTOM_CSS_HTML, unsafe_allow_html=True)
 
 # --- 3. SESSION STATE INITIALIZATION ---
 def initialize_session_state():
@@ -151,6 +57,22 @@ def initialize_session_state():
         st.session_state.manual_barcode_input = ""
     if 'selected_demo_product' not in st.session_state:
         st.session_state.selected_demo_product = None
+    if 'last_upload_signature' not in st.session_state:
+        st.session_state.last_upload_signature = None
+    if 'pdf_requested_for' not in st.session_state:
+        st.session_state.pdf_requested_for = None
+    # Memoized render inputs, each stored with the inputs it was computed from, so reruns
+    # caused by unrelated widgets skip the lookups and scoring
+    if 'product_view' not in st.session_state:
+        st.session_state.product_view = None
+    if 'comparison' not in st.session_state:
+        st.session_state.comparison = None
+    if 'scanned_overview' not in st.session_state:
+        st.session_state.scanned_overview = None
+    if 'basket_import' not in st.session_state:
+        st.session_state.basket_import = None
+    if 'basket_pdf_requested_for' not in st.session_state:
+        st.session_state.basket_pdf_requested_for = None
 
 # --- 4. CALLBACK FUNCTIONS ---
 # Callback functions to update the barcode in session state
@@ -170,318 +92,487 @@ def update_barcode_from_upload(detected_barcode):
     # Removed: st.session_state.manual_barcode_input = detected_barcode # This line caused the error
     st.session_state.selected_demo_product = None # Clear other inputs
 
+def request_pdf_report(barcode):
+    # The PDF is only built once asked for, instead of on every rerun of the product view
+    st.session_state.pdf_requested_for = barcode
+
+def request_basket_report(barcodes):
+    st.session_state.basket_pdf_requested_for = barcodes
+
 
 # --- 5. HELPER FUNCTIONS FOR DATA PROCESSING / PDF GENERATION ---
-def _get_carbon_footprint(prod_data):
-    carbon_footprint_100g = None
-    # 1. Try to get direct 'carbon-footprint_100g'
-    if "carbon-footprint_100g" in prod_data:
-        try:
-            carbon_footprint_100g = float(prod_data["carbon-footprint_100g"])
-        except ValueError:
-            pass
-
-    # 2. Fallback to ecoscore_data.agribalyse.co2_total if direct field is missing
-    if carbon_footprint_100g is None and "ecoscore_data" in prod_data:
-        ecoscore_data_obj = prod_data.get("ecoscore_data", {})
-        agribalyse_data = ecoscore_data_obj.get("agribalyse", {})
-        if "co2_total" in agribalyse_data:
-            try:
-                # co2_total from Agribalyse is often per kg. Multiply by 100 to get per 100g.
-                carbon_footprint_100g = float(agribalyse_data["co2_total"]) * 100
-            except ValueError:
-                pass
-    return carbon_footprint_100g
-
-def _get_eco_grade_details(green_score, ecoscore_grade_char):
-    eco_grade_display = ""
-    grade_color = "black"
-    grade_icon = "❓"
-
-    if ecoscore_grade_char in ['A', 'B', 'C', 'D', 'E']:
-        if ecoscore_grade_char == 'A':
-            eco_grade_display = "A (Excellent)"
-            grade_color = "green"
-            grade_icon = "🌳"
-        elif ecoscore_grade_char == 'B':
-            eco_grade_display = "B (Good)"
-            grade_color = "lightgreen"
-            grade_icon = "🌿"
-        elif ecoscore_grade_char == 'C':
-            eco_grade_display = "C (Average)"
-            grade_color = "orange"
-            grade_icon = "🌱"
-        elif ecoscore_grade_char == 'D':
-            eco_grade_display = "D (Poor)"
-            grade_color = "darkorange"
-            grade_icon = "⚠️"
-        elif ecoscore_grade_char == 'E':
-            eco_grade_display = "E (Dangerous)"
-            grade_color = "red"
-            grade_icon = "☠️"
-    else:
-        # Fallback to green_score calculation if ecoscore_grade is not A-E
-        if green_score >= 80:
-            eco_grade_display = "A (Excellent)"
-            grade_color = "green"
-            grade_icon = "🌳"
-        elif green_score >= 60:
-            eco_grade_display = "B (Good)"
-            grade_color = "lightgreen"
-            grade_icon = "🌿"
-        elif green_score >= 40:
-            eco_grade_display = "C (Average)"
-            grade_color = "orange"
-            grade_icon = "🌱"
-        elif green_score >= 20:
-            eco_grade_display = "D (Poor)"
-            grade_color = "darkorange"
-            grade_icon = "⚠️"
-        else:
-            eco_grade_display = "E (Dangerous)"
-            grade_color = "red"
-            grade_icon = "☠️"
-    return eco_grade_display, grade_color, grade_icon
-
-def generate_pdf_bytes(product_name, green_score, barcode, eco_grade_display, carbon_footprint_str):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=14)
-    pdf.cell(200, 10, txt="EcoScan Sustainability Report", ln=1, align='C')
-    pdf.cell(200, 10, txt=f"Product: {product_name}", ln=2)
-    pdf.cell(200, 10, txt=f"Barcode: {barcode}", ln=3)
-    pdf.cell(200, 10, txt=f"Green Score: {green_score}/100", ln=4)
-    pdf.cell(200, 10, txt=f"Eco-Grade: {eco_grade_display}", ln=5)
-    # Replace problematic character for PDF output
-    safe_carbon_footprint_str = carbon_footprint_str.replace('CO₂e', 'CO2e')
-    pdf.cell(200, 10, txt=f"Carbon Footprint: {safe_carbon_footprint_str}", ln=6)
-    
-    # Return the PDF as bytes
-    return pdf.output(dest='S').encode('latin-1')
+# Scoring and report helpers live in ecoscan_core.py, shared with the HTTP API in api_server.py.
 
 # --- 6. UI COMPONENT FUNCTIONS ---
 
+def display_scanned_products(barcodes):
+    # Quick carbon overview of everything found in a multi-image upload, greenest first
+    memo = st.session_state.scanned_overview
+    if memo is None or memo["barcodes"] != tuple(barcodes):
+        rows = []
+        api_error = False
+        for barcode, prod, error in iter_products(barcodes):
+            if prod is None:
+                api_error = api_error or error is not None
+                rows.append((float("inf"), f"`{barcode}` - {'API error' if error else 'not found'}"))
+                continue
+            carbon = _get_carbon_footprint(prod)
+            carbon_str = f"{round(carbon)} g CO₂e / 100g" if carbon is not None else "no carbon data"
+            rows.append((carbon if carbon is not None else float("inf"), f"`{barcode}` **{prod.product_name or 'Unknown Product'}** - {carbon_str}"))
+        memo = {"barcodes": tuple(barcodes), "markdown": "\n".join(f"- {line}" for _, line in sorted(rows, key=lambda row: row[0]))}
+        if not api_error:  # failed lookups are retried on the next rerun
+            st.session_state.scanned_overview = memo
+    st.markdown(memo["markdown"])
+
+def _build_product_view(barcode):
+    # Everything the product view shows for one barcode: looked up and scored once,
+    # then kept in st.session_state.product_view until the barcode changes
+    try:
+        prod = fetch_product(barcode)
+    except ProductAPIError:
+        return {"barcode": barcode, "status": "error"}
+    if prod is None:
+        return {"barcode": barcode, "status": "not_found"}
+
+    # Carbon Emission & EcoScore Logic
+    with instrumentation.span("score.carbon_footprint"):
+        carbon_footprint_100g = _get_carbon_footprint(prod)
+    display_carbon_footprint = "N/A"
+    if carbon_footprint_100g is not None:
+        display_carbon_footprint = f"{round(carbon_footprint_100g)} g CO₂e / 100g"
+
+    green_score, ecoscore_grade_char = _get_ecoscore(prod)
+
+    with instrumentation.span("score.eco_grade"):
+        eco_grade_display, grade_color, grade_icon = _get_eco_grade_details(green_score, ecoscore_grade_char)
+
+    with instrumentation.span("index.alternatives"):
+        alternatives = recommend_alternatives(barcode, prod)
+
+    return {
+        "barcode": barcode,
+        "status": "ok",
+        "name": prod.product_name or "Unknown Product",
+        "image": prod.image_front_url or "",
+        "brand": prod.brands or "Unknown Brand",
+        "categories": prod.categories or "Unknown Category",
+        "nutriscore": prod.nutriscore_grade or "N/A",
+        "display_carbon_footprint": display_carbon_footprint,
+        "green_score": green_score,
+        "eco_grade_display": eco_grade_display,
+        "grade_color": grade_color,
+        "grade_icon": grade_icon,
+        "alternatives": alternatives,
+    }
+
 def display_tab1_product_info(barcode_to_display):
     report_container = st.empty() # Ensure we have a container to write into
 
     if barcode_to_display:
-        with st.spinner('Fetching product details and generating report...'):
-            time.sleep(1) # Simulate network delay or processing time
-
-            res = requests.get(f"https://world.openfoodfacts.org/api/v0/product/{barcode_to_display}.json")
-
-            with report_container.container():
-                if res.status_code == 200:
-                    data = res.json()
-                    if data.get("status") == 1:
-                        prod = data["product"]
-                        name = prod.get("product_name", "Unknown Product")
-                        image = prod.get("image_front_url", "")
-                        brand = prod.get("brands", "Unknown Brand")
-                        categories = prod.get("categories", "Unknown Category")
-                        nutriscore = prod.get("nutriscore_grade", "N/A")
-
-                        # Carbon Emission & EcoScore Logic
-                        carbon_footprint_100g = _get_carbon_footprint(prod)
-                        display_carbon_footprint = "N/A"
-                        if carbon_footprint_100g is not None:
-                            display_carbon_footprint = f"{round(carbon_footprint_100g)} g CO₂e / 100g"
-
-                        ecoscore_data_obj = prod.get("ecoscore_data", {})
-                        green_score = ecoscore_data_obj.get("score", 0)
-                        ecoscore_grade_char = ecoscore_data_obj.get("grade", "u").upper()
-
-                        eco_grade_display, grade_color, grade_icon = _get_eco_grade_details(green_score, ecoscore_grade_char)
-
-                        # Badge + PDF Download side-by-side
-                        col1, col2 = st.columns([3, 1])
-                        with col1:
-                            st.markdown(
-                                f"<span style='color: {grade_color}; font-weight: bold;'>{grade_icon} Eco-Grade: {eco_grade_display}</span>",
-                                unsafe_allow_html=True
-                            )
-                        with col2:
+        view = st.session_state.product_view
+        if view is None or view["barcode"] != barcode_to_display:
+            with st.spinner('Fetching product details and generating report...'):
+                view = _build_product_view(barcode_to_display)
+            if view["status"] != "error": # API errors are retried on the next rerun
+                st.session_state.product_view = view
+
+        with report_container.container():
+            if view["status"] == "ok":
+                name = view["name"]
+                green_score = view["green_score"]
+                eco_grade_display = view["eco_grade_display"]
+                display_carbon_footprint = view["display_carbon_footprint"]
+
+                # Badge + PDF Download side-by-side
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    st.markdown(
+                        f"<span style='color: {view['grade_color']}; font-weight: bold;'>{view['grade_icon']} Eco-Grade: {eco_grade_display}</span>",
+                        unsafe_allow_html=True
+                    )
+                with col2:
+                    if st.session_state.pdf_requested_for == barcode_to_display:
+                        with instrumentation.span("report.pdf"):
                             pdf_bytes = generate_pdf_bytes(name, green_score, barcode_to_display, eco_grade_display, display_carbon_footprint)
-                            st.download_button(
-                                label="📄 Download PDF",
-                                data=pdf_bytes,
-                                file_name=f"EcoScan_Report_{barcode_to_display}.pdf",
-                                mime="application/pdf",
-                                key="download_pdf_button"
-                            )
-
-                        # Product image and info side-by-side
-                        img_col, info_col = st.columns([1, 3])
-                        with img_col:
-                            if image:
-                                st.image(image, width=120)
-                        with info_col:
-                            st.markdown(f"### 🏷️ {name}")
-                            st.markdown(f"**Brand:** {brand}")
-                            st.markdown(f"**Categories:** {categories}")
-                            st.markdown(f"**Nutri-Score:** `{nutriscore.upper()}`")
-                            st.markdown(f"**Carbon Footprint:** {display_carbon_footprint}")
-                            st.metric("♻️ Green Score", f"{green_score}/100")
-
-                        # st.metric("♻️ Green Score", f"{green_score}/100")
-                        # st.progress(green_score / 100)
-
-                        # Pie chart breakdown based on Agribalyse data
-                        # pie_labels = ["Agriculture", "Processing", "Packaging", "Transportation", "Distribution", "Consumption", "Other/Unknown"]
-                        # pie_values = [0, 0, 0, 0, 0, 0, 100]
-
-                        # agribalyse_data = ecoscore_data_obj.get("agribalyse", {})
-                        # if agribalyse_data:
-                        #     try:
-                        #         co2_agri = agribalyse_data.get("co2_agriculture", 0)
-                        #         co2_proc = agribalyse_data.get("co2_processing", 0)
-                        #         co2_pack = agribalyse_data.get("co2_packaging", 0)
-                        #         co2_trans = agribalyse_data.get("co2_transportation", 0)
-                        #         co2_dist = agribalyse_data.get("co2_distribution", 0)
-                        #         co2_cons = agribalyse_data.get("co2_consumption", 0)
-                        #         co2_sum_breakdown = co2_agri + co2_proc + co2_pack + co2_trans + co2_dist + co2_cons
-
-                        #         if co2_sum_breakdown > 0:
-                        #             pie_values = [
-                        #                 (co2_agri / co2_sum_breakdown) * 100,
-                        #                 (co2_proc / co2_sum_breakdown) * 100,
-                        #                 (co2_pack / co2_sum_breakdown) * 100,
-                        #                 (co2_trans / co2_sum_breakdown) * 100,
-                        #                 (co2_dist / co2_sum_breakdown) * 100,
-                        #                 (co2_cons / co2_sum_breakdown) * 100,
-                        #                 0
-                        #             ]
-                        #         else:
-                        #             pie_values = [0,0,0,0,0,0,100]
-                        #     except Exception:
-                        #         pass
-
-                        # fig = go.Figure(go.Pie(labels=pie_labels, values=pie_values))
-                        # fig.update_layout(height=250, margin=dict(t=0, b=0, l=0, r=0))
-                        # st.plotly_chart(fig, use_container_width=True)
-
-                        # Raw Data Copy Feature
-                        # st.subheader("📋 Raw Product Data")
-                        # json_data_str = json.dumps(data, indent=2)
-                        # st.text_area(
-                        #     "Copy JSON Data",
-                        #     json_data_str,
-                        #     height=200,
-                        #     key="copy_data_text",
-                        #     help="Click the copy icon to copy the full product data in JSON format."
-                        # )
+                        st.download_button(
+                            label="📄 Download PDF",
+                            data=pdf_bytes,
+                            file_name=f"EcoScan_Report_{barcode_to_display}.pdf",
+                            mime="application/pdf",
+                            key="download_pdf_button"
+                        )
                     else:
-                        st.error("❌ Product not found.")
-                else:
-                    st.error("❌ API error.")
+                        st.button(
+                            "📄 Create PDF",
+                            key="create_pdf_button",
+                            on_click=request_pdf_report,
+                            args=(barcode_to_display,)
+                        )
+
+                # Product image and info side-by-side
+                img_col, info_col = st.columns([1, 3])
+                with img_col:
+                    if view["image"]:
+                        st.image(view["image"], width=120)
+                with info_col:
+                    st.markdown(f"### 🏷️ {name}")
+                    st.markdown(f"**Brand:** {view['brand']}")
+                    st.markdown(f"**Categories:** {view['categories']}")
+                    st.markdown(f"**Nutri-Score:** `{view['nutriscore'].upper()}`")
+                    st.markdown(f"**Carbon Footprint:** {display_carbon_footprint}")
+                    st.metric("♻️ Green Score", f"{green_score}/100")
+
+                # Greener products from the same category, when an offline index is configured
+                if view["alternatives"]:
+                    st.markdown("#### 🌱 Greener Alternatives")
+                    st.markdown("\n".join(
+                        f"- **{alt['product_name']}** (`{alt['barcode']}`) - {alt['carbon_footprint_100g']} g CO₂e / 100g"
+                        + (f", {alt['saving_100g']} g less" if alt["saving_100g"] is not None else "")
+                        + f" · _{alt['category']}_"
+                        for alt in view["alternatives"]
+                    ))
+
+                # st.metric("♻️ Green Score", f"{green_score}/100")
+                # st.progress(green_score / 100)
+
+                # Pie chart breakdown based on Agribalyse data
+                # pie_labels = ["Agriculture", "Processing", "Packaging", "Transportation", "Distribution", "Consumption", "Other/Unknown"]
+                # pie_values = [0, 0, 0, 0, 0, 0, 100]
+
+                # agribalyse_data = ecoscore_data_obj.get("agribalyse", {})
+                # if agribalyse_data:
+                #     try:
+                #         co2_agri = agribalyse_data.get("co2_agriculture", 0)
+                #         co2_proc = agribalyse_data.get("co2_processing", 0)
+                #         co2_pack = agribalyse_data.get("co2_packaging", 0)
+                #         co2_trans = agribalyse_data.get("co2_transportation", 0)
+                #         co2_dist = agribalyse_data.get("co2_distribution", 0)
+                #         co2_cons = agribalyse_data.get("co2_consumption", 0)
+                #         co2_sum_breakdown = co2_agri + co2_proc + co2_pack + co2_trans + co2_dist + co2_cons
+
+                #         if co2_sum_breakdown > 0:
+                #             pie_values = [
+                #                 (co2_agri / co2_sum_breakdown) * 100,
+                #                 (co2_proc / co2_sum_breakdown) * 100,
+                #                 (co2_pack / co2_sum_breakdown) * 100,
+                #                 (co2_trans / co2_sum_breakdown) * 100,
+                #                 (co2_dist / co2_sum_breakdown) * 100,
+                #                 (co2_cons / co2_sum_breakdown) * 100,
+                #                 0
+                #             ]
+                #         else:
+                #             pie_values = [0,0,0,0,0,0,100]
+                #     except Exception:
+                #         pass
+
+                # fig = go.Figure(go.Pie(labels=pie_labels, values=pie_values))
+                # fig.update_layout(height=250, margin=dict(t=0, b=0, l=0, r=0))
+                # st.plotly_chart(fig, use_container_width=True)
+
+                # Raw Data Copy Feature
+                # st.subheader("📋 Raw Product Data")
+                # json_data_str = json.dumps(data, indent=2)
+                # st.text_area(
+                #     "Copy JSON Data",
+                #     json_data_str,
+                #     height=200,
+                #     key="copy_data_text",
+                #     help="Click the copy icon to copy the full product data in JSON format."
+                # )
+            elif view["status"] == "not_found":
+                st.error("❌ Product not found.")
+            else:
+                st.error("❌ API error.")
     else:
         report_container.info("⬅️ Upload image, pick demo, or enter a barcode to begin.")
 
-def display_tab2_product_comparison(barcode1, barcode2, compare_button):
-    comparison_result_placeholder = st.empty()
+def parse_barcode_list(raw_text):
+    # Accept one barcode per line (commas/spaces also work) and drop duplicates, keeping order
+    barcodes = []
+    for token in raw_text.replace(",", " ").split():
+        if token not in barcodes:
+            barcodes.append(token)
+    return barcodes
+
+def _render_comparison(results, messages, total, final, chart_key="comparison_chart"):
+    # results: list of (barcode, name, carbon) for products with carbon data, in arrival order.
+    # Every draw within one script run needs its own chart_key: the progress and final
+    # charts can show the same figure, and Streamlit rejects two identical unkeyed charts.
+    st.subheader("📊 Comparison Report")
+    if not final:
+        st.progress(len(results) / total if total else 1.0, text=f"Fetched {len(results)} of {total} products...")
+
+    ranked = sorted(results, key=lambda item: item[2])
+    if len(ranked) >= 2:
+        _, lowest_name, lowest_carbon = ranked[0]
+        highest_carbon = ranked[-1][2]
+        if final:
+            if lowest_carbon < highest_carbon:
+                st.success(f"**{lowest_name}** has the lowest carbon emissions of the {len(ranked)} products compared. Choose the greener option! 🌳")
+            else:
+                st.info("All products have similar carbon emissions.")
 
-    if not barcode1 and not barcode2 and not compare_button:
-        comparison_result_placeholder.info("Enter barcodes for two products and click 'Compare Carbon Emissions' to see the report.")
+        st.write("---")
 
-    if compare_button:
-        with st.spinner('Comparing products...'):
-            time.sleep(1.5)
-
-            product1_name = "Product 1"
-            product1_carbon = None
-            product2_name = "Product 2"
-            product2_carbon = None
-            messages = []
-
-            # --- Fetch and Extract Carbon Footprint for Product 1 ---
-            if barcode1:
-                res1 = requests.get(f"https://world.openfoodfacts.org/api/v0/product/{barcode1}.json")
-                if res1.status_code == 200:
-                    data1 = res1.json()
-                    if data1.get("status") == 1:
-                        prod1 = data1["product"]
-                        product1_name = prod1.get("product_name", f"Product {barcode1}")
-                        product1_carbon = _get_carbon_footprint(prod1)
-                        if product1_carbon is None:
-                            messages.append(f"⚠️ Carbon data not found for {product1_name} (Product 1).")
-                        else:
-                            product1_carbon = round(product1_carbon)
-                    else:
-                        messages.append(f"⚠️ Product 1 ({barcode1}) not found in Open Food Facts.")
-                else:
-                    messages.append(f"❌ API error for Product 1 ({barcode1}).")
+        colors = []
+        for _, _, carbon in ranked:
+            if lowest_carbon < highest_carbon and carbon == highest_carbon:
+                colors.append('red')
+            elif carbon == lowest_carbon:
+                colors.append('green')
             else:
-                messages.append("⚠️ Please enter a barcode for Product 1.")
-
-            # --- Fetch and Extract Carbon Footprint for Product 2 ---
-            if barcode2:
-                res2 = requests.get(f"https://world.openfoodfacts.org/api/v0/product/{barcode2}.json")
-                if res2.status_code == 200:
-                    data2 = res2.json()
-                    if data2.get("status") == 1:
-                        prod2 = data2["product"]
-                        product2_name = prod2.get("product_name", f"Product {barcode2}")
-                        product2_carbon = _get_carbon_footprint(prod2)
-                        if product2_carbon is None:
-                            messages.append(f"⚠️ Carbon data not found for {product2_name} (Product 2).")
-                        else:
-                            product2_carbon = round(product2_carbon)
-                    else:
-                        messages.append(f"⚠️ Product 2 ({barcode2}) not found in Open Food Facts.")
-                else:
-                    messages.append(f"❌ API error for Product 2 ({barcode2}).")
+                colors.append('darkgreen')
+
+        with instrumentation.span("chart.build"):
+            import plotly.graph_objects as go
+            fig_comp = go.Figure(data=[
+                # The barcode keeps products with the same name on bars of their own
+                go.Bar(x=[f"{name} ({barcode})" for barcode, name, _ in ranked], y=[carbon for _, _, carbon in ranked],
+                       marker_color=colors)
+            ])
+            fig_comp.update_layout(
+                title_text='Carbon Emissions Comparison',
+                yaxis_title='Carbon Emission (gCO2e)',
+                height=300
+            )
+            st.plotly_chart(fig_comp, use_container_width=True, key=chart_key)
+
+        ranking_lines = [f"{rank}. **{name}** ({barcode}) - {carbon} g CO₂e / 100g"
+                         for rank, (barcode, name, carbon) in enumerate(ranked, start=1)]
+        st.markdown("\n".join(ranking_lines))
+    elif final:
+        st.info("Enter valid barcodes for at least two products to see the comparison.")
+
+    if final:
+        for msg in messages:
+            if "⚠️" in msg:
+                st.warning(msg)
+            elif "❌" in msg:
+                st.error(msg)
+
+def build_basket_report(report_rows):
+    with instrumentation.span("report.basket_pdf"):
+        return generate_basket_pdf_bytes(report_rows)
+
+def display_basket_report_download(found_products):
+    # Built on request and kept once per process, so every session comparing the same
+    # products downloads the same bytes
+    found_barcodes = tuple(barcode for barcode, _ in found_products)
+    if st.session_state.basket_pdf_requested_for != found_barcodes:
+        st.button(
+            "📄 Create basket report (PDF)",
+            key="create_basket_pdf_button",
+            on_click=request_basket_report,
+            args=(found_barcodes,)
+        )
+        return
+    # Keyed on what the pages show, so a product whose data changed gets a fresh report
+    report_rows = tuple(_get_report_fields(barcode, prod) for barcode, prod in found_products)
+    pdf_bytes = shared_blobs.get_or_create(("basket_pdf", report_rows), lambda: build_basket_report(report_rows))
+    st.download_button(
+        label="📄 Download basket report (PDF)",
+        data=pdf_bytes,
+        file_name="EcoScan_Basket_Report.pdf",
+        mime="application/pdf",
+        key="download_basket_pdf_button"
+    )
+
+def _run_comparison(barcodes, placeholder):
+    # Fetches and scores the products, redrawing `placeholder` as results arrive; returns
+    # what the final report needs, to be memoized in st.session_state.comparison
+    results = []
+    found_products = [] # (barcode, product) for the basket PDF; products are shared with the product cache, not copied
+    messages = []
+    api_errors = 0
+    if len(barcodes) < 2:
+        messages.append("⚠️ Please enter at least two barcodes to compare.")
+
+    # --- Fetch all products concurrently and redraw the report as they arrive ---
+    last_render = 0.0
+    progress_renders = 0
+    for barcode, prod, error in iter_products(barcodes):
+        if error is not None:
+            api_errors += 1
+            messages.append(f"❌ API error for {barcode}.")
+        elif prod is None:
+            messages.append(f"⚠️ Product {barcode} not found in Open Food Facts.")
+        else:
+            found_products.append((barcode, prod))
+            product_name = prod.product_name or f"Product {barcode}"
+            with instrumentation.span("score.carbon_footprint"):
+                product_carbon = _get_carbon_footprint(prod)
+            if product_carbon is None:
+                messages.append(f"⚠️ Carbon data not found for {product_name} ({barcode}).")
             else:
-                messages.append("⚠️ Please enter a barcode for Product 2.")
+                results.append((barcode, product_name, round(product_carbon)))
 
-            # Write all comparison results and messages to the placeholder
-            with comparison_result_placeholder.container():
-                st.subheader("📊 Comparison Report")
+        # Redrawing the chart is not free, so throttle intermediate updates
+        if time.monotonic() - last_render >= COMPARISON_REFRESH_SECONDS:
+            with placeholder.container():
+                _render_comparison(results, messages, len(barcodes), final=False,
+                                   chart_key=f"comparison_chart_progress_{progress_renders}")
+            progress_renders += 1
+            last_render = time.monotonic()
 
-                if product1_carbon is not None and product2_carbon is not None:
-                    if product1_carbon < product2_carbon:
-                        st.success(f"**{product1_name}** has lower carbon emissions than {product2_name}. Choose the greener option! 🌳")
-                    elif product2_carbon < product1_carbon:
-                        st.success(f"**{product2_name}** has lower carbon emissions than {product1_name}. Choose the greener option! 🌳")
-                    else:
-                        st.info("Both products have similar carbon emissions.")
-
-                    st.write("---")
-
-                    color1 = 'green'
-                    color2 = 'darkgreen'
-                    if product1_carbon is not None and product2_carbon is not None:
-                        if product1_carbon > product2_carbon:
-                            color1 = 'red'
-                        elif product2_carbon > product1_carbon:
-                            color2 = 'red'
-
-                    fig_comp = go.Figure(data=[
-                        go.Bar(name=product1_name, x=[product1_name], y=[product1_carbon], marker_color=color1),
-                        go.Bar(name=product2_name, x=[product2_name], y=[product2_carbon], marker_color=color2)
-                    ])
-                    fig_comp.update_layout(
-                        barmode='group',
-                        title_text='Carbon Emissions Comparison',
-                        yaxis_title='Carbon Emission (gCO2e)',
-                        height=300
-                    )
-                    st.plotly_chart(fig_comp, use_container_width=True)
-                else:
-                    st.info("Enter valid barcodes for both products to see the comparison.")
+    found_products.sort(key=lambda item: barcodes.index(item[0]))
+    return {"barcodes": tuple(barcodes), "results": results, "messages": messages, "api_errors": api_errors, "found_products": found_products}
+
+def display_tab2_product_comparison(barcodes, compare_button):
+    comparison_result_placeholder = st.empty()
 
-                for msg in messages:
-                    if "⚠️" in msg:
-                        st.warning(msg)
-                    elif "❌" in msg:
-                        st.error(msg)
+    if not barcodes and not compare_button:
+        comparison_result_placeholder.info("Enter barcodes for two or more products and click 'Compare Carbon Emissions' to see the report.")
+
+    # The last comparison is redrawn from session state while its barcodes are unchanged;
+    # pressing the button again only refetches when some lookups had failed
+    memo = st.session_state.comparison
+    if memo is not None and memo["barcodes"] != tuple(barcodes):
+        memo = None
+    if compare_button and (memo is None or memo["api_errors"]):
+        with st.spinner('Comparing products...'):
+            memo = _run_comparison(barcodes, comparison_result_placeholder)
+        st.session_state.comparison = memo
+
+    if memo is not None:
+        # Write all comparison results and messages to the placeholder
+        with comparison_result_placeholder.container():
+            _render_comparison(memo["results"], memo["messages"], len(barcodes), final=True)
+            if len(memo["found_products"]) >= 2:
+                display_basket_report_download(memo["found_products"])
+
+def _run_basket_import(uploaded):
+    # Streams the upload through basket_import, writing the per-item CSV to a temporary
+    # file as it goes; returns the totals for st.session_state.basket_import and, unless it
+    # is over BASKET_ITEMS_CSV_MAX_BYTES, puts the CSV in shared_blobs under
+    # ("basket_items", file id), outside the session's budget
+    from basket_import import BasketTotals, iter_basket, open_basket, score_basket, write_items_csv
+    progress_bar = st.progress(0.0, text="Scoring basket...")
+    last_render = [0.0]
+    uploaded.seek(0)
+
+    def progress(totals):
+        if time.monotonic() - last_render[0] >= COMPARISON_REFRESH_SECONDS:
+            done = min(uploaded.tell() / uploaded.size, 1.0) if uploaded.size else 1.0
+            progress_bar.progress(done, text=f"Scored {totals.lines:,} lines, {totals.total_co2e_g / 1000:,.1f} kg CO₂e so far...")
+            last_render[0] = time.monotonic()
+
+    totals = BasketTotals()
+    fh, fmt = open_basket(uploaded.name, uploaded)
+    try:
+        with tempfile.TemporaryFile("w+", encoding="utf-8", newline="") as items_fh:
+            with instrumentation.span("basket.import"):
+                write_items_csv(score_basket(iter_basket(fh, fmt), totals, progress=progress), items_fh)
+            items_fh.flush()
+            items_csv_kept = os.fstat(items_fh.fileno()).st_size <= BASKET_ITEMS_CSV_MAX_BYTES
+            if items_csv_kept:
+                items_fh.seek(0)
+                shared_blobs.put(("basket_items", uploaded.file_id), items_fh.read().encode("utf-8"))
+    finally:
+        fh.detach() # leave the upload itself open for later reruns
+    progress_bar.empty()
+    return {"file_id": uploaded.file_id, "totals": totals.as_dict(), "items_csv_kept": items_csv_kept}
+
+def display_tab3_basket_import():
+    st.subheader("🧾 Score a Receipt or Order List")
+    st.caption("CSV or JSONL, one item per line: `barcode`, optional `quantity` (default 1) and `weight_g` (grams per unit).")
+    uploaded = st.file_uploader("Basket file", type=["csv", "tsv", "txt", "jsonl", "ndjson", "json", "gz"], key="basket_file")
+    if uploaded is None:
+        st.info("Upload a basket file to see its total carbon footprint.")
+        return
+
+    memo = st.session_state.basket_import
+    if memo is not None and memo["file_id"] != uploaded.file_id:
+        memo = None
+    if st.button("Score basket", key="score_basket_button"):
+        memo = _run_basket_import(uploaded)
+        st.session_state.basket_import = memo
+    if memo is None:
+        return
+
+    totals = memo["totals"]
+    statuses = totals["statuses"]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total CO₂e", f"{totals['total_co2e_g'] / 1000:,.2f} kg")
+    col2.metric("Lines scored", f"{statuses['ok']:,} / {totals['lines']:,}")
+    col3.metric("CO₂e per kg", f"{totals['co2e_g_per_kg']:,.0f} g" if totals["co2e_g_per_kg"] is not None else "N/A")
+    skipped = {status: count for status, count in statuses.items() if status != "ok" and count}
+    if skipped:
+        st.warning("Not in the total: " + ", ".join(f"{count:,} {status.replace('_', ' ')}" for status, count in skipped.items()))
+    if totals["top_contributors"]:
+        st.markdown("**Largest contributors**")
+        st.dataframe(
+            [{"line": item["line"], "barcode": item["barcode"], "product": item["product_name"], "quantity": item["quantity"],
+              "g CO₂e": round(item["co2e_g"])} for item in totals["top_contributors"]],
+            hide_index=True
+        )
+    if not memo["items_csv_kept"]:
+        st.caption(f"Per-item results are over {BASKET_ITEMS_CSV_MAX_BYTES:,} bytes, too large to keep for download; "
+                   "`python basket_import.py <file> --output items.csv` writes them to a file.")
+        return
+    items_csv = shared_blobs.get(("basket_items", memo["file_id"]))
+    if items_csv is None:
+        st.caption("Per-item results were dropped to free memory; score the basket again to download them.")
+        return
+    st.download_button(
+        label="Download per-item results (CSV)",
+        data=items_csv,
+        file_name="EcoScan_Basket_Items.csv",
+        mime="text/csv",
+        key="download_basket_items_button"
+    )
+
+def track_session_memory():
+    # Keeps this session's memos within its budget and records their size for the debug panel
+    sizes, dropped = enforce_budget(st.session_state, SESSION_MEMO_KEYS)
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        sessions.record(ctx.session_id, sizes, dropped, _is_active_session)
+
+def _is_active_session(session_id):
+    return not runtime.exists() or runtime.get_instance().is_active_session(session_id)
+
+def display_debug_panel():
+    # Hidden unless ECOSCAN_DEBUG=1 or the page is opened with ?debug=1
+    with st.sidebar:
+        st.subheader("🛠️ Debug: Timings")
+        spans = instrumentation.snapshot()
+        if spans:
+            st.dataframe(
+                [{"stage": name, **{k: v for k, v in summary.items() if k != "buckets"}} for name, summary in spans.items()],
+                hide_index=True
+            )
+        else:
+            st.caption("No spans recorded yet.")
+        st.download_button(
+            label="Download timings (JSON)",
+            data=instrumentation.dump_json(),
+            file_name="ecoscan_timings.json",
+            mime="application/json",
+            key="download_timings_button"
+        )
+        if st.button("Reset timings", key="reset_timings_button"):
+            instrumentation.reset()
+        st.subheader("🗄️ Debug: Product Cache")
+        st.json(cache_stats(), expanded=False)
+        st.subheader("📷 Debug: Decode Cache")
+        decoder = sys.modules.get("barcode_decoder")  # not loaded until the first upload
+        st.json(decoder.decode_cache.stats() if decoder else {"loaded": False}, expanded=False)
+        st.subheader("🌐 Debug: Open Food Facts Client")
+        st.json(client_stats(), expanded=False)
+        st.subheader("🔥 Debug: Cache Warm-up")
+        st.json({"warmup": warmup_stats(), "access_log": access_log.stats()}, expanded=False)
+        st.subheader("🧠 Debug: Memory")
+        st.json(sessions.report(_is_active_session), expanded=False)
 
 # --- 7. MAIN APP FUNCTION ---
 def main():
+    # Prefetch demo, default comparison and popular products in the background (once per process)
+    start_warmup(list(DEMO_BARCODES_MAP.values()) + DEFAULT_COMPARISON_BARCODES)
     st.title(PAGE_TITLE)
     apply_custom_css()
     initialize_session_state()
 
-    tab1, tab2 = st.tabs(["Current Features", "Product Comparison"])
+    tab1, tab2, tab3 = st.tabs(["Current Features", "Product Comparison", "Basket Import"])
 
     with tab1:
         left_col, right_col = st.columns([1, 2])
@@ -495,16 +586,41 @@ def main():
                 value=st.session_state.manual_barcode_input
             )
 
-            uploaded_img = st.file_uploader("📷 Upload barcode image", type=["png", "jpg", "jpeg"])
-            if uploaded_img:
-                img = Image.open(uploaded_img)
-                result = decode(img)
-                if result:
-                    detected_barcode = result[0].data.decode("utf-8")
-                    st.success(f"✅ Barcode detected: {detected_barcode}")
-                    update_barcode_from_upload(detected_barcode)
-                else:
+            uploaded_files = st.file_uploader(
+                "📷 Upload barcode images (or a .zip)",
+                type=["png", "jpg", "jpeg", "zip"],
+                accept_multiple_files=True
+            )
+            if uploaded_files:
+                from barcode_decoder import decode_batch, iter_upload_images
+                with instrumentation.span("decode.batch"):
+                    decoded_images, decode_stats = decode_batch(list(iter_upload_images(uploaded_files)))
+                detected_barcodes = []
+                for decoded in decoded_images:
+                    for barcode in decoded.barcodes:
+                        if barcode not in detected_barcodes:
+                            detected_barcodes.append(barcode)
+                    if decoded.error:
+                        st.warning(f"⚠️ Could not read {decoded.name}: {decoded.error}")
+                    elif not decoded.barcodes and len(decoded_images) > 1:
+                        st.warning(f"⚠️ No barcode found in {decoded.name}.")
+
+                if detected_barcodes:
+                    st.success(f"✅ Barcode detected: {', '.join(detected_barcodes)}")
+                    # Only a new upload selects its barcode; reruns with the same images must not
+                    # override a demo pick or manual entry made since
+                    upload_signature = tuple(decoded.digest for decoded in decoded_images)
+                    if upload_signature != st.session_state.last_upload_signature:
+                        st.session_state.last_upload_signature = upload_signature
+                        update_barcode_from_upload(detected_barcodes[0])
+                    if len(detected_barcodes) > 1:
+                        display_scanned_products(detected_barcodes)
+                elif len(decoded_images) <= 1:
                     st.error("❌ No barcode found in image.")
+                if decode_stats["images"] > 1:
+                    st.caption(f"Decoded {decode_stats['images']} images in {decode_stats['seconds']} s ({decode_stats['images_per_second']} images/s, {decode_stats['cached']} from cache)")
+            else:
+                st.session_state.last_upload_signature = None
 
             # Set default value of selectbox based on current_barcode if it matches a demo product
             initial_demo_index = 0
@@ -531,12 +647,25 @@ def main():
         left_panel_col, right_panel_col = st.columns([1, 3])
         with left_panel_col:
             st.subheader("📚 Enter Product Barcodes")
-            barcode1 = st.text_input("Barcode for Product 1", key="barcode1_comp", placeholder="e.g., 3017620429484", value="3017620429484")
-            barcode2 = st.text_input("Barcode for Product 2", key="barcode2_comp", placeholder="e.g., 5449000000996", value="8901058001181")
+            barcodes_text = st.text_area(
+                "Barcodes to compare (one per line)",
+                key="barcodes_comp",
+                placeholder="e.g., 3017620429484\n5449000000996",
+                value="\n".join(DEFAULT_COMPARISON_BARCODES),
+                height=150
+            )
             compare_button = st.button("Compare Carbon Emissions")
 
         with right_panel_col:
-            display_tab2_product_comparison(barcode1, barcode2, compare_button)
+            display_tab2_product_comparison(parse_barcode_list(barcodes_text), compare_button)
+
+    with tab3:
+        display_tab3_basket_import()
+
+    track_session_memory()
+
+    if DEBUG_ENV_ENABLED or st.query_params.get("debug") == "1":
+        display_debug_panel()
 
 # --- Run the main application ---
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+import hashlib
+import io
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from pyzbar.pyzbar import decode
+
+from product_cache import MISS, LRUCache
+
+# --- 1. CONFIGURATION ---
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+MAX_DECODE_SIDE = int(os.environ.get("ECOSCAN_MAX_DECODE_SIDE", "1280"))  # longest edge fed to zbar on the first pass
+DECODE_WORKERS = int(os.environ.get("ECOSCAN_DECODE_WORKERS", str(os.cpu_count() or 2)))
+# Below this many images the process pool costs more than it saves
+MIN_IMAGES_FOR_POOL = 2
+DECODE_CACHE_SIZE = int(os.environ.get("ECOSCAN_DECODE_CACHE_SIZE", "512"))
+
+
+@dataclass
+class DecodedImage:
+    name: str
+    barcodes: list = field(default_factory=list)
+    error: str = None
+    digest: str = None  # content hash of the image bytes
+
+
+# --- 2. SINGLE IMAGE DECODING ---
+def _zbar(img):
+    barcodes = []
+    for result in decode(img):
+        value = result.data.decode("utf-8", errors="replace")
+        if value not in barcodes:
+            barcodes.append(value)
+    return barcodes
+
+
+def _fallback_views(gray, downscaled):
+    # Progressively more expensive retries, only used when the cheap pass finds nothing
+    if downscaled:
+        yield gray  # full resolution: thin bars may not survive downscaling
+    for angle in (90, 45, -45):
+        yield gray.rotate(angle, expand=True, fillcolor=255)
+    width, height = gray.size
+    yield ImageOps.autocontrast(gray)
+    yield gray.crop((width // 4, height // 4, width * 3 // 4, height * 3 // 4)).resize((width, height))
+    yield gray.crop((0, 0, width, height // 2))
+    yield gray.crop((0, height // 2, width, height))
+
+
+def decode_image_bytes(data):
+    # Returns every distinct barcode found in one encoded image
+    with Image.open(io.BytesIO(data)) as img:
+        gray = ImageOps.exif_transpose(img).convert("L")
+    small = gray
+    if max(gray.size) > MAX_DECODE_SIDE:
+        small = gray.copy()
+        small.thumbnail((MAX_DECODE_SIDE, MAX_DECODE_SIDE))
+    barcodes = _zbar(small)
+    if barcodes:
+        return barcodes
+    for view in _fallback_views(gray, downscaled=small is not gray):
+        barcodes = _zbar(view)
+        if barcodes:
+            return barcodes
+    return []
+
+
+def _decode_named(item):
+    name, data = item
+    try:
+        return DecodedImage(name, decode_image_bytes(data))
+    except UnidentifiedImageError:
+        return DecodedImage(name, error="not a readable image")
+    except Exception as exc:  # a corrupt upload must not take the whole batch down
+        return DecodedImage(name, error=str(exc))
+
+
+# --- 3. UPLOAD EXPANSION ---
+def iter_upload_images(uploaded_files):
+    # Yields (name, bytes) for every image in the uploads, unpacking .zip archives
+    for uploaded in uploaded_files:
+        data = uploaded.getvalue()
+        if uploaded.name.lower().endswith(".zip") and zipfile.is_zipfile(io.BytesIO(data)):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                        yield f"{uploaded.name}/{info.filename}", archive.read(info)
+        else:
+            yield uploaded.name, data  # a broken archive surfaces as an unreadable image
+
+
+# --- 4. BATCH DECODING ON A PROCESS POOL ---
+# Decode results memoized by image content, shared by all sessions. Streamlit reruns
+# the script on every interaction with the upload still in place, so this turns the
+# repeat decodes into a hash and a dict lookup.
+decode_cache = LRUCache(max_entries=DECODE_CACHE_SIZE, ttl=float("inf"))
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def image_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def get_decode_pool():
+    # Spawned (not forked) workers, so they do not inherit the Streamlit server's threads
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=DECODE_WORKERS, mp_context=get_context("spawn"))
+    return _pool
+
+
+def decode_batch(images):
+    # images: list of (name, bytes). Returns ([DecodedImage, ...] in input order, stats dict)
+    start = time.perf_counter()
+    results = [None] * len(images)
+    pending = []  # (position, digest, (name, bytes)) for images not decoded before
+    for position, (name, data) in enumerate(images):
+        digest = image_digest(data)
+        cached = decode_cache.get(digest)
+        if cached is MISS:
+            pending.append((position, digest, (name, data)))
+        else:
+            barcodes, error = cached
+            results[position] = DecodedImage(name, list(barcodes), error, digest)
+
+    if len(pending) >= MIN_IMAGES_FOR_POOL and DECODE_WORKERS > 1:
+        decoded = list(get_decode_pool().map(_decode_named, [item for _, _, item in pending]))
+    else:
+        decoded = [_decode_named(item) for _, _, item in pending]
+    for (position, digest, _), result in zip(pending, decoded):
+        result.digest = digest
+        decode_cache.set(digest, (tuple(result.barcodes), result.error))
+        results[position] = result
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "images": len(images),
+        "cached": len(images) - len(pending),
+        "barcodes": sum(len(result.barcodes) for result in results),
+        "seconds": round(elapsed, 3),
+        "images_per_second": round(len(images) / elapsed, 1) if elapsed > 0 else None,
+    }
+    return results, stats
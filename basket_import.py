@@ -0,0 +1,265 @@
+"""Score a whole receipt or order list: per-item and total CO₂e for a CSV/JSONL basket.
+
+    python basket_import.py receipt.csv --output items.csv
+    python basket_import.py orders.jsonl.gz --json
+
+One item per line. A CSV needs a header with a barcode column (barcode, code or ean)
+and may have quantity (quantity or qty, default 1) and weight_g (weight_g, weight or
+grams: grams per unit) columns; JSONL lines are objects with the same keys. The file
+is streamed and looked up in batches, so memory stays flat whatever its length.
+"""
+import argparse
+import csv
+import gzip
+import heapq
+import io
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass
+
+from ecoscan_core import _get_carbon_footprint
+from off_client import iter_products
+
+# --- 1. CONFIGURATION ---
+# Distinct barcodes looked up per batch; the fetch pool bounds how many are in flight
+BATCH_SIZE = int(os.environ.get("ECOSCAN_BASKET_BATCH", "200"))
+# Lines held per batch, whatever their barcodes: repeats and invalid lines add none
+BATCH_MAX_LINES = int(os.environ.get("ECOSCAN_BASKET_BATCH_LINES", "5000"))
+TOP_CONTRIBUTORS = 10
+BARCODE_KEYS = ("barcode", "code", "ean")
+QUANTITY_KEYS = ("quantity", "qty")
+WEIGHT_KEYS = ("weight_g", "weight", "grams")
+ITEM_CSV_COLUMNS = ("line", "barcode", "quantity", "weight_g", "status", "product_name", "co2e_per_100g", "co2e_g")
+
+
+@dataclass
+class BasketItem:
+    line: int
+    barcode: str
+    quantity: float = 1.0
+    weight_g: float = None  # per unit
+    # ok, invalid, not_found, error (API), no_carbon (no footprint data), no_weight
+    status: str = None
+    product_name: str = None
+    co2e_per_100g: float = None
+    co2e_g: float = None  # whole line: quantity x weight
+
+
+# --- 2. STREAMING READERS ---
+def open_basket(name, fileobj=None):
+    # Returns (text file, "csv" | "jsonl") for a path, or for an open binary file called `name`
+    base = name[:-3] if name.lower().endswith(".gz") else name
+    fmt = "jsonl" if base.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+    raw = fileobj if fileobj is not None else open(name, "rb")
+    if name.lower().endswith(".gz"):
+        raw = gzip.GzipFile(fileobj=raw)
+    return io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline=""), fmt
+
+
+def _first(record, keys):
+    for key in keys:
+        value = record.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _to_item(line, record):
+    barcode = str(_first(record, BARCODE_KEYS) or "").strip()
+    item = BasketItem(line=line, barcode=barcode)
+    try:
+        quantity = _first(record, QUANTITY_KEYS)
+        item.quantity = float(quantity) if quantity is not None else 1.0
+        weight = _first(record, WEIGHT_KEYS)
+        item.weight_g = float(weight) if weight is not None else None
+    except (TypeError, ValueError):
+        item.status = "invalid"
+        return item
+    # nan/inf parse as floats, but would turn the totals into NaN and the JSON output invalid
+    valid_quantity = math.isfinite(item.quantity) and item.quantity > 0
+    valid_weight = item.weight_g is None or (math.isfinite(item.weight_g) and item.weight_g >= 0)
+    if not barcode or not valid_quantity or not valid_weight:
+        item.status = "invalid"
+    return item
+
+
+def _iter_csv(fh):
+    header = fh.readline()
+    try:
+        delimiter = csv.Sniffer().sniff(header, delimiters=",;\t").delimiter
+    except csv.Error:
+        delimiter = ","
+    reader = csv.DictReader(itertools.chain([header], fh), delimiter=delimiter)
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    for line, row in enumerate(reader, start=2):
+        if any(row.values()):
+            yield _to_item(line, row)
+
+
+def _iter_jsonl(fh):
+    for line, text in enumerate(fh, start=1):
+        text = text.strip()
+        if not text:
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError:
+            record = None
+        if isinstance(record, dict):
+            yield _to_item(line, {str(key).lower(): value for key, value in record.items()})
+        else:
+            yield BasketItem(line=line, barcode="", status="invalid")
+
+
+def iter_basket(fh, fmt):
+    # Yields a BasketItem per line of the basket; items that cannot be parsed come back
+    # with status "invalid" rather than stopping the import
+    return _iter_jsonl(fh) if fmt == "jsonl" else _iter_csv(fh)
+
+
+# --- 3. SCORING ---
+class BasketTotals:
+    def __init__(self, top_n=TOP_CONTRIBUTORS):
+        self.top_n = top_n
+        self.lines = 0
+        self.units = 0.0
+        self.total_weight_g = 0.0  # of the items with a CO₂e value
+        self.total_co2e_g = 0.0
+        self.statuses = dict.fromkeys(("ok", "invalid", "not_found", "error", "no_carbon", "no_weight"), 0)
+        self._top = []  # min-heap of (co2e_g, line, item), at most top_n long
+
+    def add(self, item):
+        self.lines += 1
+        self.statuses[item.status] += 1
+        if item.status == "invalid":
+            return
+        self.units += item.quantity
+        if item.co2e_g is not None:
+            self.total_weight_g += item.quantity * item.weight_g
+            self.total_co2e_g += item.co2e_g
+            entry = (item.co2e_g, item.line, item)
+            if len(self._top) < self.top_n:
+                heapq.heappush(self._top, entry)
+            elif entry[:2] > self._top[0][:2]:
+                heapq.heapreplace(self._top, entry)
+
+    def top_contributors(self):
+        return [item for _, _, item in sorted(self._top, key=lambda entry: entry[:2], reverse=True)]
+
+    def as_dict(self):
+        return {
+            "lines": self.lines,
+            "units": round(self.units, 3),
+            "statuses": dict(self.statuses),
+            "total_weight_g": round(self.total_weight_g, 1),
+            "total_co2e_g": round(self.total_co2e_g, 1),
+            "co2e_g_per_kg": round(self.total_co2e_g / (self.total_weight_g / 1000), 1) if self.total_weight_g else None,
+            "top_contributors": [asdict(item) for item in self.top_contributors()],
+        }
+
+
+def _batches(items, batch_size, max_lines=BATCH_MAX_LINES):
+    # Groups items so that each batch holds at most batch_size distinct barcodes and at
+    # most max_lines items
+    batch, barcodes = [], set()
+    for item in items:
+        new_barcode = item.status is None and item.barcode not in barcodes
+        if len(batch) >= max_lines or (new_barcode and len(barcodes) >= batch_size):
+            yield batch, barcodes
+            batch, barcodes = [], set()
+        if item.status is None:
+            barcodes.add(item.barcode)
+        batch.append(item)
+    if batch:
+        yield batch, barcodes
+
+
+def score_basket(items, totals, batch_size=BATCH_SIZE, progress=None):
+    # Yields the items back, scored, in input order, and adds each to totals.
+    # progress(totals) is called after every batch.
+    for batch, barcodes in _batches(items, batch_size):
+        found = {barcode: (prod, error) for barcode, prod, error in iter_products(barcodes)}
+        for item in batch:
+            if item.status is None:
+                prod, error = found[item.barcode]
+                if error is not None:
+                    item.status = "error"
+                elif prod is None:
+                    item.status = "not_found"
+                else:
+                    item.product_name = prod.product_name
+                    item.co2e_per_100g = _get_carbon_footprint(prod)
+                    if item.co2e_per_100g is None:
+                        item.status = "no_carbon"
+                    elif item.weight_g is None:
+                        item.status = "no_weight"
+                    else:
+                        item.status = "ok"
+                        item.co2e_g = round(item.co2e_per_100g * item.weight_g / 100 * item.quantity, 3)
+            totals.add(item)
+            yield item
+        if progress:
+            progress(totals)
+
+
+def write_items_csv(items, fh):
+    # Streams scored items out as CSV, one row each, and returns how many were written
+    writer = csv.writer(fh)
+    writer.writerow(ITEM_CSV_COLUMNS)
+    count = 0
+    for item in items:
+        writer.writerow(["" if value is None else value for value in (getattr(item, column) for column in ITEM_CSV_COLUMNS)])
+        count += 1
+    return count
+
+
+# --- 4. CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("basket", help="CSV or JSONL file (optionally .gz)")
+    parser.add_argument("--output", help="write one scored row per item to this CSV file")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--json", action="store_true", help="print the totals as JSON")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    last_report = [0.0]
+
+    def progress(totals):
+        now = time.perf_counter()
+        if now - last_report[0] < 0.5:
+            return
+        last_report[0] = now
+        print(f"\r{totals.lines:,} lines, {totals.total_co2e_g / 1000:,.1f} kg CO2e ({totals.lines / (now - start):,.0f} lines/s)",
+              end="", file=sys.stderr, flush=True)
+
+    totals = BasketTotals()
+    fh, fmt = open_basket(args.basket)
+    with fh:
+        items = score_basket(iter_basket(fh, fmt), totals, args.batch_size, progress)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8", newline="") as out:
+                write_items_csv(items, out)
+        else:
+            for _ in items:
+                pass
+    print(f"\r{totals.lines:,} lines in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+    summary = totals.as_dict()
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return summary
+    print(f"{summary['lines']:,} lines, {summary['units']:,} units: {summary['total_co2e_g'] / 1000:,.2f} kg CO2e"
+          f" for {summary['total_weight_g'] / 1000:,.2f} kg of scored products")
+    print("By status: " + ", ".join(f"{status} {count:,}" for status, count in summary["statuses"].items()))
+    for rank, item in enumerate(summary["top_contributors"], start=1):
+        print(f"{rank:>3}. {item['barcode']} {item['product_name'] or ''} - {item['co2e_g']:,.0f} g CO2e")
+    return summary
+
+
+if __name__ == "__main__":
+    main()
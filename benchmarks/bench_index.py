@@ -0,0 +1,157 @@
+"""Offline product index: builds one from a small synthetic dump, checks it, then times it.
+
+    python benchmarks/bench_index.py [--products 1000 100000] [--json results.json]
+
+The dump is written both as gzipped JSONL and as tab-separated CSV, with a few of the
+malformed lines real Open Food Facts exports contain (broken JSON, non-object lines,
+ecoscore_data that is not an object, scores such as "inf"). The check makes sure those
+are skipped or read as missing values, and that every other product comes back from
+the index exactly as Product.from_off reads it, with its alternatives in carbon order.
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_off_server import synthetic_products  # noqa: E402
+from product import Product  # noqa: E402
+from product_index import ProductIndex, build_index, split_categories  # noqa: E402
+
+LOOKUPS = 2000
+
+# Lines that must not stop a build: skipped entirely...
+BAD_JSONL_LINES = ['{"code": "1000000000001", "product_name": ', "[1, 2]", "42", '"text"', '{"code": ""}']
+# ...or kept, with the malformed fields read as missing
+ODD_JSONL_DOCS = [
+    {"code": "1000000000002", "product_name": "String ecoscore_data", "ecoscore_data": "unknown"},
+    {"code": "1000000000003", "product_name": "List agribalyse", "ecoscore_data": {"score": 40, "agribalyse": [1.5]}},
+]
+CSV_COLUMNS = ["code", "product_name", "brands", "categories", "nutriscore_grade", "carbon-footprint_100g",
+               "ecoscore_score", "ecoscore_grade"]
+ODD_CSV_SCORES = {"1000000000004": "inf", "1000000000005": "1e400", "1000000000006": "n/a"}
+
+
+# --- 1. SYNTHETIC DUMPS ---
+def write_jsonl_dump(path, docs):
+    with gzip.open(path, "wt", encoding="utf-8") as fh:
+        for doc in docs.values():
+            fh.write(json.dumps(doc) + "\n")
+        for line in BAD_JSONL_LINES:
+            fh.write(line + "\n")
+        for doc in ODD_JSONL_DOCS:
+            fh.write(json.dumps(doc) + "\n")
+
+
+def write_csv_dump(path, docs):
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        writer = csv.writer(fh, delimiter="\t")
+        writer.writerow(CSV_COLUMNS)
+        for doc in docs.values():
+            ecoscore = doc["ecoscore_data"]
+            writer.writerow([doc["code"], doc["product_name"], doc["brands"], doc["categories"], doc["nutriscore_grade"],
+                             doc.get("carbon-footprint_100g", ""), ecoscore["score"], ecoscore["grade"]])
+        writer.writerow(["", "no barcode"] + [""] * (len(CSV_COLUMNS) - 2))
+        for barcode, score in ODD_CSV_SCORES.items():
+            writer.writerow([barcode, "Odd score", "", "", "", "", score, ""])
+
+
+# --- 2. CHECKS ---
+def _check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def _check_alternatives(index, docs):
+    # Every list is in carbon order, and shares a category with the product asked about
+    for doc in list(docs.values())[:50]:
+        found = index.alternatives(doc["categories"], exclude={doc["code"]})
+        carbons = [carbon for _, carbon, _ in found]
+        _check(carbons == sorted(carbons), f"{doc['code']}: alternatives not in carbon order")
+        wanted = set(split_categories(doc["categories"]))
+        _check(all(category in wanted for category, _, _ in found), f"{doc['code']}: alternative from another category")
+
+
+def check_jsonl_index(index, docs):
+    _check(len(index) == len(docs) + len(ODD_JSONL_DOCS), f"{len(index)} products indexed, expected {len(docs) + len(ODD_JSONL_DOCS)}")
+    for barcode, doc in docs.items():
+        _check(index.get(barcode) == Product.from_off(barcode, doc), f"{barcode}: indexed product differs from the dump")
+    string_data, list_agribalyse = (index.get(doc["code"]) for doc in ODD_JSONL_DOCS)
+    _check(string_data.ecoscore_score is None and string_data.agribalyse_co2_total is None, "string ecoscore_data not read as missing")
+    _check(list_agribalyse.ecoscore_score == 40 and list_agribalyse.agribalyse_co2_total is None, "list agribalyse not read as missing")
+    _check(index.get("1000000000001") is None, "broken JSON line was indexed")
+    _check_alternatives(index, docs)
+
+
+def check_csv_index(index, docs):
+    _check(len(index) == len(docs) + len(ODD_CSV_SCORES), f"{len(index)} products indexed, expected {len(docs) + len(ODD_CSV_SCORES)}")
+    for barcode, doc in docs.items():
+        product = index.get(barcode)
+        _check(product is not None and product.ecoscore_score == doc["ecoscore_data"]["score"], f"{barcode}: wrong score")
+        _check(product.carbon_footprint_100g == (doc.get("carbon-footprint_100g") or None), f"{barcode}: wrong carbon")
+    for barcode in ODD_CSV_SCORES:
+        _check(index.get(barcode).ecoscore_score is None, f"{barcode}: unparseable score not read as missing")
+    _check_alternatives(index, docs)
+
+
+# --- 3. RUN ---
+def _time_lookups(index, barcodes):
+    start = time.perf_counter()
+    for i in range(LOOKUPS):
+        index.get(barcodes[i % len(barcodes)])
+    return (time.perf_counter() - start) / LOOKUPS * 1e6
+
+
+def run(count, tmp):
+    docs = synthetic_products(count)
+    barcodes = list(docs)
+    results = []
+    for name, writer, checker in (("jsonl.gz", write_jsonl_dump, check_jsonl_index), ("csv", write_csv_dump, check_csv_index)):
+        dump_path = os.path.join(tmp, f"dump-{count}.{name}")
+        index_path = os.path.join(tmp, f"index-{count}-{name}.sqlite3")
+        writer(dump_path, docs)
+        start = time.perf_counter()
+        build_index(dump_path, index_path)
+        seconds = time.perf_counter() - start
+        index = ProductIndex(index_path)
+        try:
+            checker(index, docs)
+            lookup_us = _time_lookups(index, barcodes)
+        finally:
+            index.close()
+        results.append({
+            "products": count,
+            "format": name,
+            "build_seconds": round(seconds, 3),
+            "build_products_per_second": round(count / seconds),
+            "lookup_us": round(lookup_us, 1),
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.products:
+            for result in run(count, tmp):
+                results.append(result)
+                print(f"{count:>9,} products  {result['format']:<8}  build {result['build_seconds']:.2f}s"
+                      f" ({result['build_products_per_second']:,}/s)  lookup {result['lookup_us']:.0f} us  (checks OK)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"benchmark": "index", "results": results}, fh, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Throughput of the scoring API with one worker process versus several sharing one cache.
+
+    python benchmarks/bench_multiprocess.py [--processes 1 4] [--clients 16] [--requests 400] [--json results.json]
+
+For each process count it starts `api_server.py --processes N` against a local
+fake_off_server and a fresh disk cache, looks every product up once (each is fetched
+upstream by whichever worker gets the request), then sends --requests basket-report
+requests from --clients concurrent clients. It reports requests per second, how many
+workers answered, and the upstream requests the load phase needed: 0 means every worker
+found the products the others had fetched in the shared cache. Linux/macOS only (fork).
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_off_server import FakeOFFServer, synthetic_products  # noqa: E402
+
+PRODUCTS = 200
+BASKET_SIZE = 10
+START_TIMEOUT = 30
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(conn, method, path, body=None):
+    conn.request(method, path, body=body)
+    res = conn.getresponse()
+    res.read()
+    return res.status, res.getheader("X-EcoScan-Worker")
+
+
+def _wait_until_up(port):
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            if _request(conn, "GET", "/v1/stats")[0] == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"api_server did not answer on port {port}")
+
+
+def run_one(processes, server, barcodes, clients, requests, seed):
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "ECOSCAN_OFF_BASE_URL": server.url,
+            "ECOSCAN_CACHE_PATH": os.path.join(tmp, "products.sqlite3"),
+            "ECOSCAN_ACCESS_LOG": "",
+            "ECOSCAN_WARMUP": "0",
+        }
+        # Own process group, so the forked workers go down with their parent
+        proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "api_server.py"), "--port", str(port),
+                                 "--processes", str(processes)], env=env, cwd=ROOT, stdout=subprocess.DEVNULL,
+                                start_new_session=True)
+        try:
+            _wait_until_up(port)
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            for barcode in barcodes:
+                _request(conn, "GET", f"/v1/products/{barcode}")
+            upstream_before = server.request_count
+
+            rng = random.Random(seed)
+            bodies = [json.dumps({"barcodes": rng.sample(barcodes, BASKET_SIZE)}) for _ in range(requests)]
+            local = threading.local()
+
+            def send(body):
+                if not hasattr(local, "conn"):
+                    local.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                return _request(local.conn, "POST", "/v1/reports/basket", body)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                outcomes = list(pool.map(send, bodies))
+            seconds = time.perf_counter() - start
+        finally:
+            os.killpg(proc.pid, signal.SIGTERM)
+            proc.wait(timeout=10)
+    answered_by = Counter(worker for _, worker in outcomes)
+    return {
+        "processes": processes,
+        "requests": requests,
+        "errors": sum(1 for status, _ in outcomes if status != 200),
+        "seconds": round(seconds, 3),
+        "requests_per_second": round(requests / seconds, 1),
+        "workers_answering": len(answered_by),
+        "upstream_requests_during_load": server.request_count - upstream_before,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, os.cpu_count() or 2])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.02, help="fake upstream latency per request, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    products = synthetic_products(PRODUCTS, seed=args.seed)
+    results = []
+    with FakeOFFServer(products, latency=args.latency) as server:
+        for processes in args.processes:
+            results.append(run_one(processes, server, list(products), args.clients, args.requests, args.seed))
+    print(f"{'processes':>9} {'req/s':>8} {'workers':>8} {'errors':>7} {'upstream during load':>21}")
+    for result in results:
+        print(f"{result['processes']:>9} {result['requests_per_second']:>8.1f} {result['workers_answering']:>8}"
+              f" {result['errors']:>7} {result['upstream_requests_during_load']:>21}")
+    print(f"({os.cpu_count()} CPUs; basket reports of {BASKET_SIZE} products, {args.clients} concurrent clients)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"benchmark": "multiprocess", "results": results}, fh, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
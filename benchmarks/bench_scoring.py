@@ -0,0 +1,122 @@
+"""Scalar vs vectorized scoring: checks the results agree, then times both.
+
+    python benchmarks/bench_scoring.py [--rows 10000 1000000] [--json results.json]
+
+Times are reported end to end (Product objects in, scores out, including building the
+frame) and for the column operations alone, which is what data already in columns pays.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ecoscan_core import _get_carbon_footprint, _get_eco_grade_details, _get_ecoscore  # noqa: E402
+from product import Product  # noqa: E402
+from scoring import products_to_frame, score_frame  # noqa: E402
+
+
+def synthetic_products(count, seed=42):
+    # Mix of the shapes seen in Open Food Facts data: numbers, numeric strings, junk and gaps
+    rng = random.Random(seed)
+    # "nan" parses to NaN, which the scalar helper keeps rather than skipping
+    direct_choices = [None, None, None, lambda: rng.uniform(0, 2000), lambda: f"{rng.uniform(0, 2000):.2f}", lambda: "n/a", lambda: "",
+                      lambda: "nan"]
+    agribalyse_choices = [None, lambda: rng.uniform(0, 20), lambda: f"{rng.uniform(0, 20):.3f}", lambda: "unknown", lambda: "nan"]
+    grade_choices = [None, "", "a", "b", "c", "d", "e", "A", "unknown", "not-applicable"]
+    products = []
+    for i in range(count):
+        direct = rng.choice(direct_choices)
+        agribalyse = rng.choice(agribalyse_choices)
+        products.append(Product(
+            barcode=str(2000000000000 + i),
+            product_name=None, brands=None, categories=None, nutriscore_grade=None, image_front_url=None,
+            carbon_footprint_100g=direct() if callable(direct) else direct,
+            agribalyse_co2_total=agribalyse() if callable(agribalyse) else agribalyse,
+            ecoscore_score=rng.choice([None, rng.randint(0, 100)]),
+            ecoscore_grade=rng.choice(grade_choices),
+        ))
+    return products
+
+
+def score_scalar(products):
+    rows = []
+    for prod in products:
+        carbon = _get_carbon_footprint(prod)
+        green_score, grade_char = _get_ecoscore(prod)
+        rows.append((carbon, green_score) + _get_eco_grade_details(green_score, grade_char))
+    return rows
+
+
+def check_parity(scalar_rows, scored):
+    columns = zip(
+        scored["carbon_footprint_100g_value"], scored["has_carbon_footprint"], scored["green_score"],
+        scored["eco_grade_display"], scored["grade_color"], scored["grade_icon"],
+    )
+    for i, (expected, actual) in enumerate(zip(scalar_rows, columns)):
+        carbon, green_score, display, color, icon = expected
+        vec_carbon, vec_has_carbon, vec_score, vec_display, vec_color, vec_icon = actual
+        if carbon is None:
+            carbon_ok = not vec_has_carbon
+        else:
+            carbon_ok = vec_has_carbon and (carbon == vec_carbon or (math.isnan(carbon) and math.isnan(vec_carbon)))
+        if not (carbon_ok and green_score == vec_score and (display, color, icon) == (vec_display, vec_color, vec_icon)):
+            raise AssertionError(f"row {i}: scalar {expected} != vectorized {actual}")
+
+
+def run(rows):
+    products = synthetic_products(rows)
+
+    start = time.perf_counter()
+    scalar_rows = score_scalar(products)
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    frame = products_to_frame(products)
+    frame_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    scored = score_frame(frame)
+    vector_seconds = time.perf_counter() - start
+
+    check_parity(scalar_rows, scored)
+    # End to end is what a caller holding Product objects pays: building the frame
+    # is itself a per-product loop, so only data that is columnar already gets the
+    # scoring-only speedup
+    end_to_end_seconds = frame_seconds + vector_seconds
+    return {
+        "rows": rows,
+        "scalar_seconds": round(scalar_seconds, 4),
+        "frame_build_seconds": round(frame_seconds, 4),
+        "vectorized_seconds": round(vector_seconds, 4),
+        "end_to_end_seconds": round(end_to_end_seconds, 4),
+        "speedup": round(scalar_seconds / end_to_end_seconds, 2) if end_to_end_seconds else None,
+        "scoring_only_speedup": round(scalar_seconds / vector_seconds, 1) if vector_seconds else None,
+        "vectorized_rows_per_second": round(rows / vector_seconds) if vector_seconds else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 1000000])
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for rows in args.rows:
+        result = run(rows)
+        results.append(result)
+        print(f"{rows:>9,} rows  scalar {result['scalar_seconds']:.3f}s  frame build {result['frame_build_seconds']:.3f}s"
+              f" + vectorized {result['vectorized_seconds']:.3f}s  end to end x{result['speedup']}"
+              f"  (scoring alone x{result['scoring_only_speedup']}; parity OK)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"benchmark": "scoring", "results": results}, fh, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Cold-start cost of the Streamlit app: module import time and first-render latency.
+
+    python benchmarks/bench_startup.py [--runs 5] [--json results.json]
+
+Every sample runs in a fresh interpreter, so nothing is already imported. "import"
+is the time to import app.py once streamlit itself is loaded (the situation under
+`streamlit run`); "first render" and "rerun" drive the page with Streamlit's AppTest.
+Lookups go to a local fake_off_server, and warm-up is disabled, so no network is used.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_off_server import FakeOFFServer  # noqa: E402
+
+# Heavy third-party modules the app should only load on first use
+HEAVY_MODULES = ("requests", "urllib3", "fpdf", "pyzbar", "plotly.graph_objects")
+
+_IMPORT_PROBE = """
+import json, sys, time
+import streamlit
+loaded_before = set(sys.modules)
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules and name not in loaded_before]
+print(json.dumps({{"import_ms": elapsed * 1000, "heavy_loaded": heavy}}))
+"""
+
+_RENDER_PROBE = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app_path!r}, default_timeout=60)
+loaded_before = set(sys.modules)
+start = time.perf_counter()
+at.run()
+first = time.perf_counter() - start
+start = time.perf_counter()
+at.run()
+rerun = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules and name not in loaded_before]
+print(json.dumps({{"first_render_ms": first * 1000, "rerun_ms": rerun * 1000,
+                  "exceptions": len(at.exception), "heavy_loaded": heavy}}))
+"""
+
+
+def _probe(code, env):
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _median(samples, key):
+    return round(statistics.median(sample[key] for sample in samples), 1)
+
+
+def run(runs):
+    with FakeOFFServer() as server, tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+            "ECOSCAN_OFF_BASE_URL": server.url,
+            "ECOSCAN_CACHE_PATH": os.path.join(tmp, "products.sqlite3"),
+            "ECOSCAN_WARMUP": "0",
+        }
+        imports = [_probe(_IMPORT_PROBE.format(heavy=HEAVY_MODULES), env) for _ in range(runs)]
+        app_path = os.path.join(ROOT, "app.py")
+        renders = [_probe(_RENDER_PROBE.format(app_path=app_path, heavy=HEAVY_MODULES), env) for _ in range(runs)]
+    return {
+        "runs": runs,
+        "import_ms": _median(imports, "import_ms"),
+        "first_render_ms": _median(renders, "first_render_ms"),
+        "rerun_ms": _median(renders, "rerun_ms"),
+        "heavy_loaded_by_import": imports[-1]["heavy_loaded"],
+        "heavy_loaded_by_first_render": renders[-1]["heavy_loaded"],
+        "render_exceptions": renders[-1]["exceptions"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    result = run(args.runs)
+    print(f"import app     {result['import_ms']:8.1f} ms   (median of {args.runs}, streamlit preloaded)")
+    print(f"first render   {result['first_render_ms']:8.1f} ms")
+    print(f"rerun          {result['rerun_ms']:8.1f} ms")
+    print(f"heavy modules loaded by import: {', '.join(result['heavy_loaded_by_import']) or 'none'}")
+    print(f"heavy modules loaded by first render: {', '.join(result['heavy_loaded_by_first_render']) or 'none'}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"benchmark": "startup", "results": result}, fh, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main()
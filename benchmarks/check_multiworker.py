@@ -0,0 +1,224 @@
+"""Two Streamlit workers behind the load balancer: checks cookie pinning and the shared cache.
+
+    python benchmarks/check_multiworker.py [--base-port 18600]
+
+Starts a local fake_off_server, two `streamlit run app.py` workers sharing a fresh disk
+cache (multiworker.WorkerPool) and a multiworker.LoadBalancer in front of them, then
+checks that:
+
+- a browser without the affinity cookie gets one, and new browsers go to both workers;
+- every request and the websocket of a pinned browser reach its own worker;
+- products compared in a session on worker 0 are cache hits for a session on worker 1,
+  which needs no upstream requests for them;
+- a browser whose worker was killed is re-pinned to the other one, and the pool
+  restarts the dead worker.
+
+Sessions are driven over the websocket the way a browser does, with Streamlit's own
+protobuf messages. Linux/macOS only; exits 1 if a check fails.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_off_server import FakeOFFServer, synthetic_products  # noqa: E402
+from multiworker import AFFINITY_COOKIE, LoadBalancer, WorkerPool, wait_until_healthy  # noqa: E402
+
+COMPARED_PRODUCTS = 8
+RUN_TIMEOUT = 60  # seconds for one script run of the app
+COMPARE_BUTTON = "Compare Carbon Emissions"
+
+
+# --- 1. A MINIMAL STREAMLIT CLIENT ---
+class StreamlitSession:
+    # One browser tab: a websocket to /_stcore/stream through the balancer. run() sends a
+    # rerun request with the given widget states and returns the elements the app drew.
+    def __init__(self, conn):
+        self.conn = conn
+
+    @classmethod
+    async def open(cls, base_url, worker=None):
+        from tornado.httpclient import HTTPRequest
+        from tornado.websocket import websocket_connect
+
+        headers = {"Cookie": f"{AFFINITY_COOKIE}={worker}"} if worker is not None else {}
+        request = HTTPRequest(base_url.replace("http://", "ws://") + "/_stcore/stream", headers=headers)
+        return cls(await websocket_connect(request, subprotocols=["streamlit"]))
+
+    @property
+    def pinned_to(self):
+        return _pinned_to(self.conn.headers.get_list("Set-Cookie"))
+
+    async def run(self, widget_states=()):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.widget_states.widgets.extend(widget_states)
+        await self.conn.write_message(msg.SerializeToString(), binary=True)
+        elements = []
+        deadline = time.monotonic() + RUN_TIMEOUT
+        while True:
+            raw = await asyncio.wait_for(self.conn.read_message(), max(0.1, deadline - time.monotonic()))
+            if raw is None:
+                raise RuntimeError("websocket closed during a script run")
+            forward = ForwardMsg()
+            forward.ParseFromString(raw)
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                elements.append(forward.delta.new_element)
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    elements = []
+                    continue
+                return elements
+
+    def close(self):
+        self.conn.close()
+
+
+def _widget(elements, kind, label):
+    for element in elements:
+        if element.WhichOneof("type") == kind and getattr(element, kind).label == label:
+            return getattr(element, kind)
+    raise AssertionError(f"no {kind} labelled {label!r} in the page")
+
+
+def _markdown(elements):
+    return "\n".join(element.markdown.body for element in elements if element.WhichOneof("type") == "markdown")
+
+
+async def compare(base_url, worker, barcodes):
+    # Opens a session pinned to `worker`, enters the barcodes in the comparison tab and
+    # presses Compare; returns the page's markdown afterwards
+    from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+    session = await StreamlitSession.open(base_url, worker)
+    try:
+        elements = await session.run()
+        text_area = WidgetState(id=_widget(elements, "text_area", "Barcodes to compare (one per line)").id,
+                                string_value="\n".join(barcodes))
+        button = WidgetState(id=_widget(elements, "button", COMPARE_BUTTON).id, trigger_value=True)
+        return _markdown(await session.run([text_area, button]))
+    finally:
+        session.close()
+
+
+# --- 2. CHECKS ---
+class Checks:
+    def __init__(self):
+        self.failed = 0
+
+    def __call__(self, condition, message):
+        print(f"{'ok  ' if condition else 'FAIL'}  {message}")
+        self.failed += not condition
+
+
+async def _http_get(base_url, path, worker=None):
+    from tornado.httpclient import AsyncHTTPClient
+
+    headers = {"Cookie": f"{AFFINITY_COOKIE}={worker}"} if worker is not None else {}
+    res = await AsyncHTTPClient().fetch(base_url + path, headers=headers, raise_error=False)
+    return res.code, _pinned_to(res.headers.get_list("Set-Cookie"))
+
+
+def _pinned_to(set_cookies):
+    # The worker number in an affinity Set-Cookie header, or None if the balancer sent none
+    for cookie in set_cookies:
+        name, _, value = cookie.partition(";")[0].partition("=")
+        if name.strip() == AFFINITY_COOKIE:
+            return int(value)
+    return None
+
+
+async def run_checks(workers, balancer, server, base_url, barcodes):
+    check = Checks()
+
+    # Pinning: new browsers get a cookie, round-robin over the workers
+    pinned = [(await _http_get(base_url, "/_stcore/health"))[1] for _ in range(4)]
+    check(None not in pinned, f"new browsers get the {AFFINITY_COOKIE} cookie")
+    check(set(pinned) == {0, 1}, f"new browsers are spread over both workers ({pinned})")
+
+    for worker in (0, 1):
+        before = list(balancer.connections)
+        replies = [await _http_get(base_url, "/_stcore/health", worker) for _ in range(3)]
+        session = await StreamlitSession.open(base_url, worker)
+        session.close()
+        served = [now - then for now, then in zip(balancer.connections, before)]
+        check(all(cookie is None for _, cookie in replies) and session.pinned_to is None,
+              f"a browser pinned to worker {worker} is not re-pinned")
+        check(served[worker] == 4 and served[1 - worker] == 0,
+              f"its requests and websocket all reach worker {worker} (connections per worker {served})")
+
+    # Shared cache: what worker 0 fetched, worker 1 reads from disk
+    markdown = await compare(base_url, 0, barcodes)
+    first_upstream = server.request_count
+    check(all(f"Synthetic product {int(b) - 2000000000000}" in markdown for b in barcodes),
+          f"worker 0 compares {len(barcodes)} products ({first_upstream} upstream requests)")
+    markdown = await compare(base_url, 1, barcodes)
+    check(all(f"Synthetic product {int(b) - 2000000000000}" in markdown for b in barcodes),
+          f"worker 1 compares the same {len(barcodes)} products")
+    check(server.request_count == first_upstream,
+          f"worker 1 found them in the shared cache ({server.request_count - first_upstream} upstream requests)")
+
+    # Failover: a browser pinned to a dead worker is re-pinned, and the worker comes back
+    workers.processes[1].kill()
+    workers.processes[1].wait()
+    code, cookie = await _http_get(base_url, "/_stcore/health", 1)
+    check(code == 200 and cookie == 0, "with worker 1 down, its browsers are re-pinned to worker 0")
+    workers.restart_exited()
+    healthy = await asyncio.get_running_loop().run_in_executor(None, wait_until_healthy, workers.ports[1], workers.host)
+    code, cookie = await _http_get(base_url, "/_stcore/health", 1)
+    check(healthy and workers.restarts == 1 and code == 200 and cookie is None, "worker 1 is restarted and serves its browsers again")
+    return check.failed
+
+
+async def _serve_and_check(workers, server, host, port, barcodes):
+    balancer = await LoadBalancer([(host, worker_port) for worker_port in workers.ports], host, port).start()
+    serving = asyncio.ensure_future(balancer.serve_forever())
+    try:
+        return await run_checks(workers, balancer, server, f"http://{host}:{port}", barcodes)
+    finally:
+        balancer.close()
+        # Let closed websockets finish passing through before the loop goes away
+        deadline = time.monotonic() + 5
+        while any(balancer.active) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        serving.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=18600, help="balancer port; the workers use the next two")
+    args = parser.parse_args(argv)
+
+    products = synthetic_products(COMPARED_PRODUCTS)
+    with FakeOFFServer(products) as server, tempfile.TemporaryDirectory() as tmp:
+        # Inherited by the workers: a fresh shared cache and log, and no warm-up, so
+        # every upstream request comes from the sessions below
+        os.environ.update({
+            "ECOSCAN_OFF_BASE_URL": server.url,
+            "ECOSCAN_CACHE_PATH": os.path.join(tmp, "products.sqlite3"),
+            "ECOSCAN_ACCESS_LOG": os.path.join(tmp, "access.log"),
+            "ECOSCAN_WARMUP": "0",
+        })
+        workers = WorkerPool(2, args.base_port + 1, args.host)
+        try:
+            print("starting 2 workers...", file=sys.stderr)
+            workers.start()
+            failed = asyncio.run(_serve_and_check(workers, server, args.host, args.base_port, list(products)))
+        finally:
+            workers.stop()
+    print("all checks passed" if not failed else f"{failed} check(s) failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
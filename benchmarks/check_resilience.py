@@ -0,0 +1,140 @@
+"""Upstream failure handling: timeouts, retries and the circuit breaker against injected faults.
+
+    python benchmarks/check_resilience.py
+
+Runs off_client.fetch_product against a local fake_off_server whose latency and errors
+are switched per check, with short timeouts so the whole run takes a few seconds:
+
+- a response slower than READ_TIMEOUT fails after about READ_TIMEOUT, without retrying;
+- a 503 followed by a good response is retried and the lookup succeeds;
+- BREAKER_FAILURES failed lookups open the breaker, which then fails fast without a
+  request; once the reset time passed, exactly one trial request goes upstream, and its
+  outcome re-opens or closes the breaker;
+- a 429 asking for Retry-After: 600 gives up within MAX_RETRIES x RETRY_AFTER_MAX.
+
+Exits 1 if a check fails.
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# No disk cache or access log, so every lookup below is decided by the fake upstream
+os.environ.update({"ECOSCAN_CACHE_PATH": "", "ECOSCAN_ACCESS_LOG": "", "ECOSCAN_WARMUP": "0"})
+
+import off_client  # noqa: E402
+from check_multiworker import Checks  # noqa: E402
+from fake_off_server import DEMO_PRODUCTS, FakeOFFServer  # noqa: E402
+
+READ_TIMEOUT = 0.5
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.05
+RETRY_AFTER_MAX = 0.4
+BREAKER_FAILURES = 3
+BREAKER_RESET = 0.5
+SLACK = 0.5  # seconds allowed on top of a computed bound
+
+
+# --- 1. SETUP ---
+def configure(server):
+    off_client.OFF_BASE_URL = server.url
+    off_client.READ_TIMEOUT = READ_TIMEOUT
+    off_client.MAX_RETRIES = MAX_RETRIES
+    off_client.RETRY_BACKOFF = RETRY_BACKOFF
+    off_client.RETRY_AFTER_MAX = RETRY_AFTER_MAX
+    off_client.reset_session()  # the retry policy is built with the session
+    reset_breaker()
+
+
+def reset_breaker():
+    off_client.breaker = off_client.CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET)
+
+
+def lookup(barcode):
+    # (product or the ProductAPIError raised, seconds taken); the cache is emptied first
+    off_client.get_product_cache().clear()
+    start = time.perf_counter()
+    try:
+        result = off_client.fetch_product(barcode)
+    except off_client.ProductAPIError as exc:
+        result = exc
+    return result, time.perf_counter() - start
+
+
+# --- 2. CHECKS ---
+def check_stall(check, server, barcode):
+    server.configure(latency=READ_TIMEOUT * 3)
+    before = server.request_count
+    result, seconds = lookup(barcode)
+    server.configure(latency=0)
+    check(isinstance(result, off_client.ProductAPIError) and seconds < READ_TIMEOUT + SLACK,
+          f"a stalled upstream fails after {seconds:.2f}s (READ_TIMEOUT {READ_TIMEOUT}s)")
+    check(server.request_count - before == 1, "a timed-out read is not retried")
+    reset_breaker()
+
+
+def check_retry(check, server, barcode):
+    server.configure(fail_next=1)
+    before = server.request_count
+    result, seconds = lookup(barcode)
+    check(result is not None and not isinstance(result, Exception) and server.request_count - before == 2,
+          f"a 503 is retried and the lookup succeeds ({server.request_count - before} requests, {seconds:.2f}s)")
+    check(off_client.breaker.state == "closed", "a recovered retry does not count against the breaker")
+
+
+def check_breaker(check, server, barcode):
+    reset_breaker()
+    server.configure(error_rate=1.0)
+    for _ in range(BREAKER_FAILURES):
+        lookup(barcode)
+    check(off_client.breaker.state == "open", f"{BREAKER_FAILURES} failed lookups open the breaker")
+
+    before = server.request_count
+    result, seconds = lookup(barcode)
+    check(isinstance(result, off_client.CircuitOpenError) and server.request_count == before,
+          f"while open, lookups fail fast without a request ({seconds * 1000:.1f} ms)")
+
+    time.sleep(BREAKER_RESET)
+    before = server.request_count
+    lookup(barcode)
+    trial_requests = server.request_count - before
+    result, _ = lookup(barcode)
+    check(trial_requests == MAX_RETRIES + 1 and off_client.breaker.state == "open"
+          and isinstance(result, off_client.CircuitOpenError) and server.request_count - before == trial_requests,
+          f"half-open lets one trial lookup through ({trial_requests} requests with retries); its failure re-opens it")
+
+    server.configure(error_rate=0.0)
+    time.sleep(BREAKER_RESET)
+    result, _ = lookup(barcode)
+    check(result is not None and not isinstance(result, Exception) and off_client.breaker.state == "closed",
+          "a successful trial lookup closes the breaker")
+
+
+def check_retry_after(check, server, barcode):
+    reset_breaker()
+    server.configure(error_rate=1.0, error_status=429, retry_after=600)
+    result, seconds = lookup(barcode)
+    server.configure(error_rate=0.0, error_status=503)
+    bound = MAX_RETRIES * RETRY_AFTER_MAX + SLACK
+    check(isinstance(result, off_client.ProductAPIError) and seconds < bound,
+          f"a 429 with Retry-After: 600 gives up after {seconds:.2f}s (bound {bound:.1f}s)")
+    reset_breaker()
+
+
+def main():
+    check = Checks()
+    barcode = next(iter(DEMO_PRODUCTS))
+    with FakeOFFServer(seed=0) as server:
+        configure(server)
+        check_stall(check, server, barcode)
+        check_retry(check, server, barcode)
+        check_breaker(check, server, barcode)
+        check_retry_after(check, server, barcode)
+    print("all checks passed" if not check.failed else f"{check.failed} check(s) failed")
+    return 1 if check.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""Reproducible EcoScan benchmark suite against a local Open Food Facts stand-in.
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --baseline results.json   # exit 1 on regression
+
+Measures single-lookup latency (cold and cached), N-way comparison latency, barcode
+decode throughput, scoring throughput, PDF generation time and peak memory. Nothing
+leaves the machine: lookups go to fake_off_server.FakeOFFServer with configurable
+latency and error rate, and the product cache lives in a temporary directory.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The cache must point somewhere disposable before off_client is first imported
+os.environ["ECOSCAN_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="ecoscan-bench-"), "products.sqlite3")
+
+import bench_scoring as scoring_bench  # noqa: E402
+import ecoscan_core  # noqa: E402
+import off_client  # noqa: E402
+from fake_off_server import DEMO_PRODUCTS, FakeOFFServer, synthetic_products  # noqa: E402
+
+COMPARISON_SIZES = (2, 10, 50)
+# Sub-millisecond timings jitter by more than any sensible tolerance; ignore changes below this
+NOISE_FLOOR_MS = 1.0
+
+
+# --- 1. MEASUREMENT HELPERS ---
+def _summarize(samples_ms):
+    # None marks a sample that failed upstream: counted as an error, left out of the timings
+    ordered = sorted(sample for sample in samples_ms if sample is not None)
+    errors = len(samples_ms) - len(ordered)
+    if not ordered:
+        return {"samples": 0, "errors": errors}
+    return {
+        "samples": len(ordered),
+        "errors": errors,
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": round(ordered[len(ordered) // 2], 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def _time_ms(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def _time_lookup_ms(func, *args):
+    # Like _time_ms, but None if a lookup failed (with --error-rate, retries can run out)
+    try:
+        return _time_ms(func, *args)
+    except off_client.ProductAPIError:
+        return None
+
+
+def _peak_python_mb(func, *args):
+    # Python heap high-water mark of one run (tracing is too slow to leave on while timing)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(*args)
+        return round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+    finally:
+        tracemalloc.stop()
+
+
+def _cold():
+    # Forget every cached product so the next lookup goes to the (fake) network
+    off_client.get_product_cache().clear()
+
+
+# --- 2. STAGES ---
+def bench_single_lookup(barcodes, iterations):
+    cold, warm = [], []
+    for i in range(iterations):
+        barcode = barcodes[i % len(barcodes)]
+        _cold()
+        cold.append(_time_lookup_ms(off_client.fetch_product, barcode))
+        warm.append(_time_lookup_ms(off_client.fetch_product, barcode))
+    return {"cold": _summarize(cold), "cached": _summarize(warm)}
+
+
+def _compare_strict(barcodes):
+    # compare_products, raising the first failed lookup instead of turning it into a message
+    outcomes = list(off_client.iter_products(barcodes))
+    for _, _, error in outcomes:
+        if error is not None:
+            raise error
+    return ecoscan_core.rank_comparison(barcodes, outcomes)
+
+
+def bench_comparison(barcodes, iterations):
+    results = {}
+    for size in COMPARISON_SIZES:
+        samples = []
+        for i in range(iterations):
+            basket = random.Random(i).sample(barcodes, size)
+            _cold()
+            samples.append(_time_lookup_ms(_compare_strict, basket))
+        results[str(size)] = _summarize(samples)
+    _cold()
+    basket = barcodes[:max(COMPARISON_SIZES)]
+    results["peak_python_mb"] = _peak_python_mb(ecoscan_core.compare_products, basket)
+    return results
+
+
+def _ean13_image(digits12, module_px=3, height=120):
+    # Renders an EAN-13 symbol (check digit added) as a PIL image, for decode benchmarks
+    from PIL import Image, ImageDraw
+
+    l_codes = ["0001101", "0011001", "0010011", "0111101", "0100011", "0110001", "0101111", "0111011", "0110111", "0001011"]
+    r_codes = ["".join("1" if bit == "0" else "0" for bit in code) for code in l_codes]
+    g_codes = [code[::-1] for code in r_codes]
+    parity = ["LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG", "LGGLLG", "LGGGLG", "LGGGGL", "LGLGLG", "LGLGGL"]
+    check = (10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits12)) % 10) % 10
+    code = digits12 + str(check)
+    bits = "101"
+    for digit, side in zip(code[1:7], parity[int(code[0])]):
+        bits += (l_codes if side == "L" else g_codes)[int(digit)]
+    bits += "01010"
+    for digit in code[7:]:
+        bits += r_codes[int(digit)]
+    bits += "101"
+
+    quiet = 10 * module_px
+    img = Image.new("L", (len(bits) * module_px + 2 * quiet, height + 2 * quiet), 255)
+    draw = ImageDraw.Draw(img)
+    for i, bit in enumerate(bits):
+        if bit == "1":
+            x = quiet + i * module_px
+            draw.rectangle([x, quiet, x + module_px - 1, quiet + height], fill=0)
+    return code, img
+
+
+def bench_decode(image_count):
+    try:
+        import barcode_decoder
+    except ImportError as exc:  # pyzbar needs the native zbar library
+        return {"skipped": f"barcode decoding unavailable: {exc}"}
+
+    images, expected = [], []
+    for i in range(image_count):
+        code, img = _ean13_image(f"{400000000000 + i * 7919:012d}")
+        # Upscaled past MAX_DECODE_SIDE so the downscale path is exercised, JPEG like a phone photo
+        canvas = img.resize((img.width * 4, img.height * 4)).convert("RGB")
+        buffer = io.BytesIO()
+        canvas.save(buffer, format="JPEG", quality=90)
+        images.append((f"bench-{i}.jpg", buffer.getvalue()))
+        expected.append(code)
+
+    barcode_decoder.decode_cache.clear()
+    barcode_decoder.decode_batch(images[:2])  # start the worker pool outside the timed run
+    barcode_decoder.decode_cache.clear()
+    decoded, stats = barcode_decoder.decode_batch(images)
+    _, cached_stats = barcode_decoder.decode_batch(images)
+    found = sum(1 for result, code in zip(decoded, expected) if code in result.barcodes)
+    return {
+        "images": stats["images"],
+        "seconds": stats["seconds"],
+        "images_per_second": stats["images_per_second"],
+        "cached_images_per_second": cached_stats["images_per_second"],
+        "decoded_correctly": found,
+    }
+
+
+def bench_scoring(rows):
+    return [scoring_bench.run(count) for count in rows]
+
+
+def bench_pdf(barcodes, iterations):
+    rows, errors = [], 0
+    for barcode in barcodes:
+        try:
+            prod = off_client.fetch_product(barcode)
+        except off_client.ProductAPIError:
+            errors += 1
+            continue
+        if prod:
+            rows.append(ecoscan_core._get_report_fields(barcode, prod))
+    if not rows:
+        return {"skipped": "no product could be fetched", "errors": errors}
+    samples = []
+    for i in range(iterations):
+        ecoscan_core.generate_pdf_bytes.cache_clear()
+        samples.append(_time_ms(ecoscan_core.generate_pdf_bytes, *rows[i % len(rows)]))
+    cached = [_time_ms(ecoscan_core.generate_pdf_bytes, *rows[0]) for _ in range(iterations)]
+
+    basket_rows = rows[:max(COMPARISON_SIZES)]
+    basket_ms = _time_ms(ecoscan_core.generate_basket_pdf_bytes, basket_rows)
+    basket_peak = _peak_python_mb(ecoscan_core.generate_basket_pdf_bytes, basket_rows)
+    return {
+        "single": _summarize(samples),
+        "single_cached": _summarize(cached),
+        "basket": {"pages": len(basket_rows), "total_ms": round(basket_ms, 3), "peak_python_mb": basket_peak},
+        "errors": errors,
+    }
+
+
+# --- 3. REGRESSION CHECK ---
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else key, item, out)
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            _flatten(f"{prefix}[{i}]", item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def find_regressions(baseline, current, tolerance):
+    # Latencies/times/memory must not grow, throughputs must not shrink, by more than `tolerance`
+    old = _flatten("", baseline["results"], {})
+    new = _flatten("", current["results"], {})
+    regressions = []
+    for key, old_value in old.items():
+        new_value = new.get(key)
+        if new_value is None or not old_value:
+            continue
+        if key.endswith("_ms") and abs(new_value - old_value) < NOISE_FLOOR_MS:
+            continue
+        if key.endswith(("_ms", "seconds", "_mb")) and "speedup" not in key:
+            if new_value > old_value * (1 + tolerance):
+                regressions.append(f"{key}: {old_value} -> {new_value}")
+        elif key.endswith(("per_second", "speedup")):
+            if new_value < old_value * (1 - tolerance):
+                regressions.append(f"{key}: {old_value} -> {new_value}")
+    return regressions
+
+
+# --- 4. ENTRY POINT ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.02, help="fake upstream latency per request, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream requests answered with 503")
+    parser.add_argument("--synthetic", type=int, default=200, help="synthetic products served next to the demo ones")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--decode-images", type=int, default=64)
+    parser.add_argument("--scoring-rows", type=int, nargs="+", default=[10000, 1000000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown before failing")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    fixtures = {**DEMO_PRODUCTS, **synthetic_products(args.synthetic, seed=args.seed)}
+    barcodes = list(fixtures)
+    stages = {}
+    with FakeOFFServer(fixtures, latency=args.latency, error_rate=args.error_rate, seed=args.seed) as server:
+        off_client.OFF_BASE_URL = server.url
+        off_client.reset_session()
+        for name, stage in (
+            ("single_lookup", lambda: bench_single_lookup(barcodes, args.iterations)),
+            ("comparison", lambda: bench_comparison(barcodes, max(3, args.iterations // 4))),
+            ("decode", lambda: bench_decode(args.decode_images)),
+            ("scoring", lambda: bench_scoring(args.scoring_rows)),
+            ("pdf", lambda: bench_pdf(barcodes, args.iterations)),
+        ):
+            print(f"running {name}...", file=sys.stderr)
+            stages[name] = stage()
+        upstream_requests = server.request_count
+
+    # ru_maxrss is KiB on Linux
+    stages["memory"] = {"peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "upstream_requests": upstream_requests,
+        },
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "results": stages,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            regressions = find_regressions(json.load(fh), report, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:\n  " + "\n  ".join(regressions), file=sys.stderr)
+            return 1
+        print("No regressions against baseline.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
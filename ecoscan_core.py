@@ -0,0 +1,214 @@
+"""Product scoring and report generation, independent of any UI.
+
+Used by the Streamlit app (app.py) and the HTTP API (api_server.py); both go through
+off_client for lookups, so they share its product cache and connection pool.
+"""
+import functools
+import math
+
+from off_client import ProductAPIError, fetch_product, get_product_index, iter_products
+
+PDF_CACHE_SIZE = 256 # Rendered single-product reports kept in memory
+
+# --- 1. SCORING ---
+def _get_carbon_footprint(prod):
+    carbon_footprint_100g = None
+    # 1. Try to get direct 'carbon-footprint_100g'
+    if prod.carbon_footprint_100g is not None:
+        try:
+            carbon_footprint_100g = float(prod.carbon_footprint_100g)
+        except (TypeError, ValueError):
+            pass
+    # "nan"/"inf" parse as floats but are no carbon data: they can not be rounded or ranked
+    if carbon_footprint_100g is not None and not math.isfinite(carbon_footprint_100g):
+        carbon_footprint_100g = None
+
+    # 2. Fallback to ecoscore_data.agribalyse.co2_total if direct field is missing
+    if carbon_footprint_100g is None and prod.agribalyse_co2_total is not None:
+        try:
+            # co2_total from Agribalyse is often per kg. Multiply by 100 to get per 100g.
+            carbon_footprint_100g = float(prod.agribalyse_co2_total) * 100
+        except (TypeError, ValueError):
+            pass
+    if carbon_footprint_100g is not None and not math.isfinite(carbon_footprint_100g):
+        carbon_footprint_100g = None
+    return carbon_footprint_100g
+
+def _get_ecoscore(prod):
+    # Green score (0 when missing) and upper-cased Eco-Score grade ("U" when unknown)
+    green_score = prod.ecoscore_score if prod.ecoscore_score is not None else 0
+    ecoscore_grade_char = (prod.ecoscore_grade or "u").upper()
+    return green_score, ecoscore_grade_char
+
+def _get_eco_grade_details(green_score, ecoscore_grade_char):
+    eco_grade_display = ""
+    grade_color = "black"
+    grade_icon = "❓"
+
+    if ecoscore_grade_char in ['A', 'B', 'C', 'D', 'E']:
+        if ecoscore_grade_char == 'A':
+            eco_grade_display = "A (Excellent)"
+            grade_color = "green"
+            grade_icon = "🌳"
+        elif ecoscore_grade_char == 'B':
+            eco_grade_display = "B (Good)"
+            grade_color = "lightgreen"
+            grade_icon = "🌿"
+        elif ecoscore_grade_char == 'C':
+            eco_grade_display = "C (Average)"
+            grade_color = "orange"
+            grade_icon = "🌱"
+        elif ecoscore_grade_char == 'D':
+            eco_grade_display = "D (Poor)"
+            grade_color = "darkorange"
+            grade_icon = "⚠️"
+        elif ecoscore_grade_char == 'E':
+            eco_grade_display = "E (Dangerous)"
+            grade_color = "red"
+            grade_icon = "☠️"
+    else:
+        # Fallback to green_score calculation if ecoscore_grade is not A-E
+        if green_score >= 80:
+            eco_grade_display = "A (Excellent)"
+            grade_color = "green"
+            grade_icon = "🌳"
+        elif green_score >= 60:
+            eco_grade_display = "B (Good)"
+            grade_color = "lightgreen"
+            grade_icon = "🌿"
+        elif green_score >= 40:
+            eco_grade_display = "C (Average)"
+            grade_color = "orange"
+            grade_icon = "🌱"
+        elif green_score >= 20:
+            eco_grade_display = "D (Poor)"
+            grade_color = "darkorange"
+            grade_icon = "⚠️"
+        else:
+            eco_grade_display = "E (Dangerous)"
+            grade_color = "red"
+            grade_icon = "☠️"
+    return eco_grade_display, grade_color, grade_icon
+
+# --- 2. PDF REPORTS ---
+# fpdf is imported inside the functions that build a document, so scoring and lookups
+# (and the app's first render) do not pay for loading it
+def _pdf_text(text):
+    # FPDF's core fonts are latin-1 only: spell out CO₂e and replace anything else it cannot encode
+    return str(text).replace('CO₂e', 'CO2e').encode('latin-1', 'replace').decode('latin-1')
+
+def _add_report_page(pdf, product_name, green_score, barcode, eco_grade_display, carbon_footprint_str):
+    pdf.add_page()
+    pdf.set_font("Arial", size=14)
+    pdf.cell(200, 10, txt="EcoScan Sustainability Report", ln=1, align='C')
+    pdf.cell(200, 10, txt=_pdf_text(f"Product: {product_name}"), ln=2)
+    pdf.cell(200, 10, txt=_pdf_text(f"Barcode: {barcode}"), ln=3)
+    pdf.cell(200, 10, txt=_pdf_text(f"Green Score: {green_score}/100"), ln=4)
+    pdf.cell(200, 10, txt=_pdf_text(f"Eco-Grade: {eco_grade_display}"), ln=5)
+    pdf.cell(200, 10, txt=_pdf_text(f"Carbon Footprint: {carbon_footprint_str}"), ln=6)
+
+# Memoized on every input, so the same product with the same data is rendered only once
+# per process; new product data means new arguments and a fresh report.
+@functools.lru_cache(maxsize=PDF_CACHE_SIZE)
+def generate_pdf_bytes(product_name, green_score, barcode, eco_grade_display, carbon_footprint_str):
+    from fpdf import FPDF
+    pdf = FPDF()
+    _add_report_page(pdf, product_name, green_score, barcode, eco_grade_display, carbon_footprint_str)
+
+    # Return the PDF as bytes
+    return pdf.output(dest='S').encode('latin-1')
+
+def _get_report_fields(barcode, prod):
+    # Arguments for generate_pdf_bytes/_add_report_page, derived like the product tab does
+    carbon_footprint_100g = _get_carbon_footprint(prod)
+    display_carbon_footprint = f"{round(carbon_footprint_100g)} g CO₂e / 100g" if carbon_footprint_100g is not None else "N/A"
+    green_score, ecoscore_grade_char = _get_ecoscore(prod)
+    eco_grade_display, _, _ = _get_eco_grade_details(green_score, ecoscore_grade_char)
+    return prod.product_name or "Unknown Product", green_score, barcode, eco_grade_display, display_carbon_footprint
+
+def generate_basket_pdf_bytes(report_rows):
+    # One page per product. FPDF keeps the whole document in memory until output() either
+    # way, so it is returned as bytes rather than written to a file and read back.
+    # report_rows can be a generator: the product data need not all be held at once.
+    from fpdf import FPDF
+    pdf = FPDF()
+    for row in report_rows:
+        _add_report_page(pdf, *row)
+    return pdf.output(dest='S').encode('latin-1')
+
+# --- 3. LOOKUP / COMPARE ---
+def score_product(barcode, prod):
+    # Everything the product view shows, as a JSON-friendly dict
+    carbon_footprint_100g = _get_carbon_footprint(prod)
+    green_score, ecoscore_grade_char = _get_ecoscore(prod)
+    eco_grade_display, grade_color, grade_icon = _get_eco_grade_details(green_score, ecoscore_grade_char)
+    return {
+        "barcode": barcode,
+        "product_name": prod.product_name or "Unknown Product",
+        "brands": prod.brands,
+        "categories": prod.categories,
+        "nutriscore_grade": prod.nutriscore_grade,
+        "image_front_url": prod.image_front_url,
+        "carbon_footprint_100g": round(carbon_footprint_100g) if carbon_footprint_100g is not None else None,
+        "green_score": green_score,
+        "eco_grade": eco_grade_display[0],
+        "eco_grade_display": eco_grade_display,
+        "grade_color": grade_color,
+        "grade_icon": grade_icon,
+    }
+
+def lookup_product(barcode):
+    # (status, payload): ("ok", scored product), ("not_found", None) or ("error", message)
+    try:
+        prod = fetch_product(barcode)
+    except ProductAPIError as exc:
+        return "error", str(exc)
+    if prod is None:
+        return "not_found", None
+    return "ok", score_product(barcode, prod)
+
+def rank_comparison(barcodes, outcomes):
+    # outcomes: (barcode, product, error) tuples as yielded by off_client.iter_products.
+    # Ranks the products with carbon data, lowest first.
+    ranked = []
+    messages = []
+    for barcode, prod, error in outcomes:
+        if error is not None:
+            messages.append(f"API error for {barcode}.")
+        elif prod is None:
+            messages.append(f"Product {barcode} not found in Open Food Facts.")
+        else:
+            scored = score_product(barcode, prod)
+            if scored["carbon_footprint_100g"] is None:
+                messages.append(f"Carbon data not found for {scored['product_name']} ({barcode}).")
+            else:
+                ranked.append(scored)
+    ranked.sort(key=lambda scored: (scored["carbon_footprint_100g"], barcodes.index(scored["barcode"])))
+    greenest = None
+    if len(ranked) >= 2 and ranked[0]["carbon_footprint_100g"] < ranked[-1]["carbon_footprint_100g"]:
+        greenest = ranked[0]["barcode"]
+    return {"ranked": ranked, "greenest": greenest, "messages": messages}
+
+def compare_products(barcodes):
+    # Looks the barcodes up concurrently, then ranks them
+    return rank_comparison(barcodes, iter_products(barcodes))
+
+# --- 4. RECOMMENDATIONS ---
+def recommend_alternatives(barcode, prod, limit=5):
+    # Lower-carbon products from the same categories, read from the offline product index
+    # (see product_index.py). Without an index, or for a product without categories, [].
+    index = get_product_index()
+    if index is None or not prod.categories:
+        return []
+    carbon_footprint_100g = _get_carbon_footprint(prod)
+    alternatives = []
+    for category, carbon, alternative in index.alternatives(prod.categories, below=carbon_footprint_100g, limit=limit, exclude={barcode}):
+        alternatives.append({
+            "barcode": alternative.barcode,
+            "product_name": alternative.product_name or "Unknown Product",
+            "brands": alternative.brands,
+            "category": category,
+            "carbon_footprint_100g": round(carbon),
+            "saving_100g": round(carbon_footprint_100g - carbon) if carbon_footprint_100g is not None else None,
+        })
+    return alternatives
@@ -0,0 +1,284 @@
+"""Local stand-in for the Open Food Facts product API, for offline runs.
+
+    python fake_off_server.py --port 8765 [--latency 0.2] [--error-rate 0.1] [--synthetic 1000]
+    ECOSCAN_OFF_BASE_URL=http://127.0.0.1:8765 streamlit run app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import time
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Trimmed-down documents for the demo products and the default comparison barcodes
+DEMO_PRODUCTS = {
+    "8901063029279": {
+        "code": "8901063029279",
+        "product_name": "Jim Jam",
+        "brands": "Britannia",
+        "categories": "Snacks, Sweet snacks, Biscuits and cakes, Biscuits",
+        "nutriscore_grade": "e",
+        "image_front_url": "",
+        "ecoscore_data": {"score": 31, "grade": "d", "agribalyse": {"co2_total": 2.51}},
+    },
+    "3017620429484": {
+        "code": "3017620429484",
+        "product_name": "Nutella",
+        "brands": "Ferrero",
+        "categories": "Breakfasts, Spreads, Sweet spreads, Hazelnut spreads, Cocoa and hazelnuts spreads",
+        "nutriscore_grade": "e",
+        "image_front_url": "",
+        "ecoscore_data": {"score": 22, "grade": "d", "agribalyse": {"co2_total": 5.33}},
+    },
+    "5449000000996": {
+        "code": "5449000000996",
+        "product_name": "Coca-Cola",
+        "brands": "Coca-Cola",
+        "categories": "Beverages, Carbonated drinks, Sodas, Colas, Sweetened beverages",
+        "nutriscore_grade": "e",
+        "image_front_url": "",
+        "carbon-footprint_100g": "17",
+        "ecoscore_data": {"score": 41, "grade": "c", "agribalyse": {"co2_total": 0.36}},
+    },
+    "7622201762063": {
+        "code": "7622201762063",
+        "product_name": "Dairy Milk",
+        "brands": "Cadbury",
+        "categories": "Snacks, Sweet snacks, Cocoa and its products, Chocolates, Milk chocolates",
+        "nutriscore_grade": "e",
+        "image_front_url": "",
+        "ecoscore_data": {"score": 18, "grade": "e", "agribalyse": {"co2_total": 6.41}},
+    },
+    "8901088068734": {
+        "code": "8901088068734",
+        "product_name": "Masala Oats",
+        "brands": "Saffola",
+        "categories": "Plant-based foods, Cereals and potatoes, Breakfast cereals, Oat flakes",
+        "nutriscore_grade": "c",
+        "image_front_url": "",
+        "ecoscore_data": {"score": 63, "grade": "b", "agribalyse": {"co2_total": 1.12}},
+    },
+    "8901058001181": {
+        "code": "8901058001181",
+        "product_name": "Maggi 2-Minute Noodles Masala",
+        "brands": "Maggi",
+        "categories": "Plant-based foods, Cereals and potatoes, Pastas, Noodles, Instant noodles",
+        "nutriscore_grade": "d",
+        "image_front_url": "",
+        "ecoscore_data": {"score": 45, "grade": "c", "agribalyse": {"co2_total": 1.87}},
+    },
+}
+
+def synthetic_products(count, seed=0):
+    # OFF-shaped documents for load tests, barcodes 2000000000000 upwards
+    rng = random.Random(seed)
+    categories = ["Snacks, Biscuits", "Beverages, Sodas", "Dairies, Cheeses", "Cereals, Breakfast cereals", "Spreads, Sweet spreads"]
+    products = {}
+    for i in range(count):
+        barcode = str(2000000000000 + i)
+        grade = rng.choice("abcde")
+        product = {
+            "code": barcode,
+            "product_name": f"Synthetic product {i}",
+            "brands": f"Brand {i % 37}",
+            "categories": rng.choice(categories),
+            "nutriscore_grade": rng.choice("abcde"),
+            "image_front_url": "",
+            "ecoscore_data": {"score": rng.randint(0, 100), "grade": grade, "agribalyse": {"co2_total": round(rng.uniform(0.1, 8), 3)}},
+            # Bulk the real API would send without ?fields=, so projection has something to trim
+            "ingredients_text": "water, sugar, " * rng.randint(5, 40),
+        }
+        if rng.random() < 0.3:
+            product["carbon-footprint_100g"] = str(round(rng.uniform(10, 900), 1))
+        products[barcode] = product
+    return products
+
+
+_PRODUCT_PATH = re.compile(r"^/api/v0/product/([^/]+)\.json$")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client connection pooling is exercised
+    # Headers and body go out in separate writes; with Nagle on, every keep-alive
+    # response would stall ~40 ms on the client's delayed ACK and swamp the timings
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            if server.fail_next > 0:
+                server.fail_next -= 1
+                inject_error = True
+            else:
+                inject_error = server.random.random() < server.error_rate
+        if server.latency:
+            time.sleep(server.latency)
+        if inject_error:
+            with server.lock:
+                server.error_count += 1
+            retry_after = {"Retry-After": str(server.retry_after)} if server.retry_after is not None else None
+            self._send_json(server.error_status, {"status": 0, "status_verbose": "injected error"}, retry_after)
+            return
+        path, _, query = self.path.partition("?")
+        fields = parse_qs(query).get("fields")
+        match = _PRODUCT_PATH.match(path)
+        if not match:
+            self._send_json(404, {"status": 0, "status_verbose": "unknown endpoint"})
+            return
+        product = server.products.get(match.group(1))
+        if product is not None and fields:
+            # Field projection, like the real API's ?fields=a,b,c
+            wanted = set(fields[0].split(","))
+            product = {key: value for key, value in product.items() if key in wanted}
+        if product is None:
+            self._send_json(200, {"code": match.group(1), "status": 0, "status_verbose": "product not found"})
+            return
+        body = json.dumps({"code": match.group(1), "status": 1, "status_verbose": "product found", "product": product})
+        # Validators for conditional requests: an ETag of the exact body, and the time
+        # the product was last changed with FakeOFFServer.set_product()
+        modified = server.modified.get(match.group(1), server.started_at)
+        validators = {
+            "ETag": '"' + hashlib.sha1(body.encode("utf-8")).hexdigest()[:16] + '"',
+            "Last-Modified": formatdate(modified, usegmt=True),
+        }
+        if self._not_modified(validators["ETag"], modified):
+            with server.lock:
+                server.not_modified_count += 1
+            self.send_response(304)
+            for name, value in validators.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+        self._send_json(200, body, validators)
+
+    def _not_modified(self, etag, modified):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:  # takes precedence over If-Modified-Since, as in RFC 9110
+            return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send_json(self, status_code, payload, headers=None):
+        body = (payload if isinstance(payload, str) else json.dumps(payload)).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up, e.g. after its read timeout
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeOFFServer:
+    # latency: seconds slept before every response (set above the client read timeout to simulate a stall)
+    # error_rate: probability of answering with error_status; fail_next: force the next N requests to fail
+    # retry_after: seconds sent as Retry-After with every injected error (None: no header)
+    def __init__(self, products=None, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, error_status=503, seed=None,
+                 retry_after=None):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.products = dict(DEMO_PRODUCTS if products is None else products)
+        self.httpd.started_at = time.time()
+        self.httpd.modified = {}  # barcode -> time changed by set_product()
+        self.httpd.request_count = 0
+        self.httpd.error_count = 0
+        self.httpd.not_modified_count = 0
+        self.httpd.latency = latency
+        self.httpd.error_rate = error_rate
+        self.httpd.error_status = error_status
+        self.httpd.retry_after = retry_after
+        self.httpd.fail_next = 0
+        self.httpd.random = random.Random(seed)
+        self.httpd.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        return self.httpd.request_count
+
+    @property
+    def error_count(self):
+        return self.httpd.error_count
+
+    @property
+    def not_modified_count(self):
+        return self.httpd.not_modified_count
+
+    def set_product(self, barcode, product):
+        # Adds, changes or (with product=None) removes a product, as an edit upstream would
+        with self.httpd.lock:
+            if product is None:
+                self.httpd.products.pop(barcode, None)
+            else:
+                self.httpd.products[barcode] = product
+            self.httpd.modified[barcode] = time.time()
+
+    def configure(self, latency=None, error_rate=None, error_status=None, fail_next=None, retry_after=None):
+        with self.httpd.lock:
+            if latency is not None:
+                self.httpd.latency = latency
+            if error_rate is not None:
+                self.httpd.error_rate = error_rate
+            if error_status is not None:
+                self.httpd.error_status = error_status
+            if fail_next is not None:
+                self.httpd.fail_next = fail_next
+            if retry_after is not None:
+                self.httpd.retry_after = retry_after
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Open Food Facts API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=int, help="Retry-After seconds sent with injected errors")
+    parser.add_argument("--synthetic", type=int, default=0, help="also serve this many synthetic products")
+    args = parser.parse_args()
+
+    server = FakeOFFServer({**DEMO_PRODUCTS, **synthetic_products(args.synthetic)},
+                           host=args.host, port=args.port, latency=args.latency,
+                           error_rate=args.error_rate, error_status=args.error_status, retry_after=args.retry_after)
+    print(f"Fake Open Food Facts API listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
@@ -0,0 +1,102 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in milliseconds; anything slower lands in the overflow bucket
+BUCKET_BOUNDS_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+# --- 1. LATENCY HISTOGRAM ---
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+class Histogram:
+    def __init__(self, bounds=BUCKET_BOUNDS_MS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+
+    def record(self, duration_ms):
+        self.buckets[bisect.bisect_left(self.bounds, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        if self.min_ms is None or duration_ms < self.min_ms:
+            self.min_ms = duration_ms
+        if self.max_ms is None or duration_ms > self.max_ms:
+            self.max_ms = duration_ms
+
+    def percentile(self, pct):
+        # Upper bound of the bucket holding the pct-th observation (capped by the real max)
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                upper = self.bounds[i] if i < len(self.bounds) else self.max_ms
+                return min(upper, self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": _round(self.total_ms / self.count) if self.count else None,
+            "min_ms": _round(self.min_ms),
+            "max_ms": _round(self.max_ms),
+            "p50_ms": _round(self.percentile(50)),
+            "p95_ms": _round(self.percentile(95)),
+            "p99_ms": _round(self.percentile(99)),
+            "buckets": {
+                **{f"le_{bound}": n for bound, n in zip(self.bounds, self.buckets)},
+                "overflow": self.buckets[-1],
+            },
+        }
+
+
+# --- 2. PROCESS-WIDE SPAN REGISTRY ---
+_histograms = {}
+_lock = threading.Lock()
+
+
+def record(name, duration_ms):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.record(duration_ms)
+
+
+@contextmanager
+def span(name):
+    # Times the enclosed block into the histogram called `name`, even if it raises
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+
+
+def snapshot():
+    with _lock:
+        return {name: histogram.summary() for name, histogram in sorted(_histograms.items())}
+
+
+def dump_json(path=None):
+    payload = json.dumps({"generated_at": time.time(), "spans": snapshot()}, indent=2)
+    if path:
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(payload)
+    return payload
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
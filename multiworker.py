@@ -0,0 +1,263 @@
+"""Run several Streamlit workers behind a local load balancer, sharing one product cache.
+
+    python multiworker.py --workers 4 --port 8501
+    ECOSCAN_OFF_BASE_URL=http://127.0.0.1:8765 python multiworker.py --workers 2
+
+Each worker is its own `streamlit run app.py` process on a port above --port, so
+decoding, scoring and PDF rendering use as many cores as there are workers. They share
+the on-disk product cache (SQLite in WAL mode) and the access log, so a product one
+worker fetched is a cache hit for the others; only the small in-memory tier is per worker.
+
+A Streamlit session lives in the worker its websocket is connected to, and its uploads
+and downloads must reach that same worker. The balancer therefore pins every browser to
+a worker with a cookie, set on the first response it passes back; requests without the
+cookie are spread round-robin over the workers that accept connections.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import re
+import secrets
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+# --- 1. CONFIGURATION ---
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+AFFINITY_COOKIE = "ecoscan_worker"
+WORKER_START_TIMEOUT = 60  # seconds to wait for a worker's health check
+SUPERVISE_INTERVAL = 2  # seconds between checks for exited workers
+PIPE_CHUNK = 64 * 1024
+
+_COOKIE_HEADER = re.compile(rb"^cookie:[^\r\n]*?\b" + AFFINITY_COOKIE.encode() + rb"=(\d+)", re.IGNORECASE | re.MULTILINE)
+
+
+# --- 2. LOAD BALANCER ---
+# A TCP proxy that only looks at the head of the first request on each connection (for
+# the affinity cookie) and of the first response (to set it); everything after that,
+# including websocket frames, is copied through untouched.
+class LoadBalancer:
+    def __init__(self, backends, host="127.0.0.1", port=8501):
+        self.backends = list(backends)  # [(host, port)], index = worker number
+        self.host = host
+        self.port = port
+        self._round_robin = itertools.count()
+        self._server = None
+        self.connections = [0] * len(self.backends)
+        self.active = [0] * len(self.backends)
+        self.connect_failures = [0] * len(self.backends)
+        self.rejected = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+
+    def _candidates(self, pinned):
+        # The pinned worker first, if any; then every worker, round-robin
+        count = len(self.backends)
+        start = next(self._round_robin) % count
+        order = [(start + offset) % count for offset in range(count)]
+        if pinned is not None and 0 <= pinned < count:
+            order.remove(pinned)
+            order.insert(0, pinned)
+        return order
+
+    async def _connect(self, pinned):
+        for index in self._candidates(pinned):
+            try:
+                reader, writer = await asyncio.open_connection(*self.backends[index])
+            except OSError:
+                self.connect_failures[index] += 1
+                continue
+            return index, reader, writer
+        return None, None, None
+
+    async def _handle(self, client_reader, client_writer):
+        try:
+            head = await client_reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+        match = _COOKIE_HEADER.search(head)
+        pinned = int(match.group(1)) if match else None
+        index, upstream_reader, upstream_writer = await self._connect(pinned)
+        if index is None:
+            self.rejected += 1
+            client_writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await _drain_and_close(client_writer)
+            return
+        self.connections[index] += 1
+        self.active[index] += 1
+        try:
+            upstream_writer.write(head)
+            # A browser that is new, or whose worker is down, is (re)pinned to this one
+            set_cookie = index if index != pinned else None
+            await asyncio.gather(
+                _pipe(client_reader, upstream_writer),
+                _pipe(upstream_reader, client_writer, set_cookie),
+            )
+        finally:
+            self.active[index] -= 1
+
+    def stats(self):
+        return {
+            "backends": [f"{host}:{port}" for host, port in self.backends],
+            "connections": list(self.connections),
+            "active": list(self.active),
+            "connect_failures": list(self.connect_failures),
+            "rejected": self.rejected,
+        }
+
+
+def _with_cookie(head, worker):
+    # Adds the affinity cookie to a response head (which ends with a blank line)
+    cookie = f"Set-Cookie: {AFFINITY_COOKIE}={worker}; Path=/; HttpOnly; SameSite=Lax\r\n".encode()
+    return head[:-2] + cookie + b"\r\n"
+
+
+async def _pipe(reader, writer, set_cookie=None):
+    try:
+        if set_cookie is not None:
+            writer.write(_with_cookie(await reader.readuntil(b"\r\n\r\n"), set_cookie))
+        while True:
+            data = await reader.read(PIPE_CHUNK)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        await _drain_and_close(writer)
+
+
+async def _drain_and_close(writer):
+    try:
+        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+    except ConnectionError:
+        pass
+
+
+# --- 3. WORKER PROCESSES ---
+def worker_command(port, host):
+    return [
+        sys.executable, "-m", "streamlit", "run", APP_PATH,
+        "--server.port", str(port),
+        "--server.address", host,
+        "--server.headless", "true",
+        "--browser.gatherUsageStats", "false",
+    ]
+
+
+def worker_env(number, cookie_secret):
+    env = dict(os.environ)
+    # One secret for all workers, so XSRF cookies stay valid if a browser is re-pinned
+    env["STREAMLIT_SERVER_COOKIE_SECRET"] = cookie_secret
+    if number > 0:
+        env["ECOSCAN_WARMUP"] = "0"  # worker 0 warms the shared disk cache for all of them
+    return env
+
+
+def wait_until_healthy(port, host, timeout=WORKER_START_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://{host}:{port}/_stcore/health", timeout=2) as res:
+                if res.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.25)
+    return False
+
+
+class WorkerPool:
+    def __init__(self, count, base_port, host="127.0.0.1"):
+        self.ports = [base_port + number for number in range(count)]
+        self.host = host
+        self.cookie_secret = secrets.token_hex(16)
+        self.processes = [None] * count
+        self.restarts = 0
+
+    def _spawn(self, number):
+        self.processes[number] = subprocess.Popen(
+            worker_command(self.ports[number], self.host), env=worker_env(number, self.cookie_secret)
+        )
+
+    def start(self):
+        for number in range(len(self.ports)):
+            self._spawn(number)
+        for port in self.ports:
+            if not wait_until_healthy(port, self.host):
+                raise RuntimeError(f"Streamlit worker on port {port} did not become healthy")
+        return self
+
+    def restart_exited(self):
+        # The balancer routes around a dead worker meanwhile; its sessions are lost
+        for number, process in enumerate(self.processes):
+            if process.poll() is not None:
+                self.restarts += 1
+                self._spawn(number)
+
+    def stop(self):
+        for process in self.processes:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+
+# --- 4. CLI ---
+async def run(workers, host, port):
+    balancer = await LoadBalancer([(host, worker_port) for worker_port in workers.ports], host, port).start()
+    print(f"EcoScan: {len(workers.ports)} workers (ports {workers.ports[0]}-{workers.ports[-1]}) behind http://{host}:{port}", flush=True)
+    serving = asyncio.ensure_future(balancer.serve_forever())
+    try:
+        while not serving.done():
+            await asyncio.sleep(SUPERVISE_INTERVAL)
+            workers.restart_exited()
+    finally:
+        balancer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8501, help="port the load balancer listens on")
+    parser.add_argument("--worker-port", type=int, help="first worker port (default: --port + 1)")
+    args = parser.parse_args(argv)
+
+    if not os.environ.get("ECOSCAN_CACHE_PATH", "unset"):
+        print("warning: ECOSCAN_CACHE_PATH is empty, so workers will not share cached products", file=sys.stderr)
+    # SIGTERM (e.g. from systemd or docker stop) shuts the workers down like Ctrl-C does
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    workers = WorkerPool(args.workers, args.worker_port or args.port + 1, args.host)
+    try:
+        workers.start()
+        asyncio.run(run(workers, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        workers.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import instrumentation
+from access_log import AccessLog
+from product import OFF_FIELDS, Product
+from product_cache import MISS, DiskCache, LRUCache, TieredProductCache
+from product_index import ProductIndex
+
+# --- 1. CONFIGURATION ---
+# Point ECOSCAN_OFF_BASE_URL at a local stand-in (see fake_off_server.py) to run offline.
+OFF_BASE_URL = os.environ.get("ECOSCAN_OFF_BASE_URL", "https://world.openfoodfacts.org")
+CACHE_PATH = os.environ.get(
+    "ECOSCAN_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "ecoscan", "products.sqlite3")
+)
+MEMORY_CACHE_SIZE = int(os.environ.get("ECOSCAN_MEMORY_CACHE_SIZE", "2048"))
+MEMORY_CACHE_TTL = float(os.environ.get("ECOSCAN_MEMORY_CACHE_TTL", "3600"))
+DISK_CACHE_TTL = float(os.environ.get("ECOSCAN_DISK_CACHE_TTL", str(7 * 24 * 3600)))
+# Past the soft TTL a cached product is still served, and refreshed in the background;
+# past DISK_CACHE_TTL (the hard TTL) it is gone and the lookup waits for upstream
+SOFT_TTL = float(os.environ.get("ECOSCAN_CACHE_SOFT_TTL", str(24 * 3600)))
+REVALIDATE_BACKOFF = float(os.environ.get("ECOSCAN_REVALIDATE_BACKOFF", "60"))  # after a failed refresh
+NEGATIVE_CACHE_TTL = float(os.environ.get("ECOSCAN_NEGATIVE_CACHE_TTL", "600"))
+# Seconds a write waits while another worker process holds the shared disk cache's lock
+CACHE_BUSY_TIMEOUT = float(os.environ.get("ECOSCAN_CACHE_BUSY_TIMEOUT", "5"))
+# Offline index built by `python product_index.py build ...`; consulted before the API
+INDEX_PATH = os.environ.get("ECOSCAN_INDEX_PATH", "")
+# Upper bound on concurrent upstream requests for the whole process, across all sessions
+FETCH_CONCURRENCY = int(os.environ.get("ECOSCAN_FETCH_CONCURRENCY", "16"))
+CONNECT_TIMEOUT = float(os.environ.get("ECOSCAN_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("ECOSCAN_READ_TIMEOUT", "10"))
+MAX_RETRIES = int(os.environ.get("ECOSCAN_MAX_RETRIES", "3"))
+RETRY_BACKOFF = float(os.environ.get("ECOSCAN_RETRY_BACKOFF", "0.3"))  # sleeps 0.3, 0.6, 1.2 s ...
+# Longest sleep before one retry, also when upstream asks for more with Retry-After, so
+# retrying adds at most MAX_RETRIES x this to a lookup
+RETRY_AFTER_MAX = float(os.environ.get("ECOSCAN_RETRY_AFTER_MAX", str(RETRY_BACKOFF * 2 ** MAX_RETRIES)))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("ECOSCAN_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("ECOSCAN_BREAKER_RESET", "30"))
+# Every lookup is logged here; warmup.py prefetches the most requested barcodes from it
+ACCESS_LOG_PATH = os.environ.get(
+    "ECOSCAN_ACCESS_LOG", os.path.join(os.path.dirname(CACHE_PATH), "access.log") if CACHE_PATH else ""
+)
+
+
+class ProductAPIError(Exception):
+    pass
+
+
+class CircuitOpenError(ProductAPIError):
+    pass
+
+
+# --- 2. SHARED PRODUCT CACHE ---
+# Lives in an imported module rather than app.py, so it survives Streamlit reruns
+# and is shared by every session served by this process.
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_product_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if CACHE_PATH:
+                    disk = DiskCache(CACHE_PATH, ttl=DISK_CACHE_TTL, negative_ttl=NEGATIVE_CACHE_TTL,
+                                     encode=Product.to_json, decode=Product.from_json, soft_ttl=SOFT_TTL,
+                                     busy_timeout=CACHE_BUSY_TIMEOUT)
+                    # Entries are copied from disk with the lifetimes they have there
+                    memory = LRUCache(max_entries=MEMORY_CACHE_SIZE, ttl=MEMORY_CACHE_TTL, negative_ttl=NEGATIVE_CACHE_TTL)
+                else:
+                    # Memory is the only tier, so it takes the disk tier's hard and soft TTLs
+                    disk = None
+                    memory = LRUCache(max_entries=MEMORY_CACHE_SIZE, ttl=DISK_CACHE_TTL, negative_ttl=NEGATIVE_CACHE_TTL,
+                                      soft_ttl=SOFT_TTL)
+                _cache = TieredProductCache(memory, disk)
+    return _cache
+
+
+access_log = AccessLog(ACCESS_LOG_PATH)
+
+
+def cache_stats():
+    stats = get_product_cache().stats()
+    index = get_product_index()
+    stats["index"] = index.stats() if index is not None else None
+    return stats
+
+
+_index = None
+_index_checked = False
+
+
+def get_product_index():
+    global _index, _index_checked
+    if not _index_checked:
+        with _cache_lock:
+            if not _index_checked:
+                if INDEX_PATH and os.path.exists(INDEX_PATH):
+                    _index = ProductIndex(INDEX_PATH)
+                _index_checked = True
+    return _index
+
+
+# --- 3. CIRCUIT BREAKER ---
+# After `failure_threshold` consecutive upstream failures the breaker opens and lookups
+# fail fast for `reset_seconds`. Then a single trial request is let through (half-open):
+# success closes the breaker again, failure re-opens it.
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.short_circuited = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half-open"
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "short_circuited": self.short_circuited}
+
+
+breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+
+
+# --- 4. REQUEST COALESCING ---
+# Concurrent lookups of one barcode (e.g. many sessions opening a promoted product)
+# share a single upstream request: the first caller runs it, the others wait for its
+# result, or its exception, instead of sending the same GET again.
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, func, *args):
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = func(*args)
+            except BaseException as exc:
+                call.error = exc
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+inflight = SingleFlight()
+
+
+# --- 5. POOLED HTTP SESSION AND FETCH WORKERS ---
+# One keep-alive session for the whole process, with a connection pool sized for the
+# fetch workers and bounded exponential-backoff retries on 429/5xx.
+_session = None
+_executor = None
+_pool_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _pool_lock:
+            if _session is None:
+                # requests/urllib3 take ~100 ms to import, so they load with the first lookup
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                class CappedRetry(Retry):
+                    # Retry-After is honoured up to RETRY_AFTER_MAX; "wait 10 minutes"
+                    # must not hold a fetch worker for 10 minutes per attempt
+                    def get_retry_after(self, response):
+                        retry_after = super().get_retry_after(response)
+                        return None if retry_after is None else min(retry_after, RETRY_AFTER_MAX)
+
+                retry = CappedRetry(
+                    total=MAX_RETRIES,
+                    connect=MAX_RETRIES,
+                    read=0,  # a timed-out read is not retried, or a stalled upstream would block for (retries+1) x READ_TIMEOUT
+                    status=MAX_RETRIES,
+                    backoff_factor=RETRY_BACKOFF,
+                    backoff_max=RETRY_AFTER_MAX,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=frozenset(["GET"]),
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=FETCH_CONCURRENCY, max_retries=retry)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def reset_session():
+    # Drop pooled connections, e.g. after changing OFF_BASE_URL or the retry settings
+    global _session
+    with _pool_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _pool_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY, thread_name_prefix="off-fetch")
+    return _executor
+
+
+def client_stats():
+    return {"breaker": breaker.stats(), "single_flight": inflight.stats(), "revalidation": revalidator.stats()}
+
+
+# --- 6. PRODUCT LOOKUP ---
+def product_url(barcode):
+    return f"{OFF_BASE_URL}/api/v0/product/{barcode}.json"
+
+
+# Sent with every lookup so the API returns only the fields in product.OFF_FIELDS
+PRODUCT_QUERY = {"fields": ",".join(OFF_FIELDS)}
+
+
+def fetch_product(barcode, record_access=True, reload=False):
+    # Returns a Product, or None when Open Food Facts does not know the barcode.
+    # API failures raise ProductAPIError and are never cached. Prefetching passes
+    # record_access=False so it does not count towards popularity, and reload=True to
+    # look past the memory tier: its entry is replaced only once a copy was read from
+    # disk, the index or upstream, so a failed reload leaves it being served.
+    if record_access:
+        access_log.record(barcode)
+    cache = get_product_cache()
+    with instrumentation.span("fetch.cache_lookup"):
+        entry = cache.get_entry(barcode, skip_memory=reload)
+    if entry is not MISS:
+        product, stale = entry
+        if stale:
+            revalidator.schedule(barcode)
+        return product
+
+    index = get_product_index()
+    if index is not None:
+        with instrumentation.span("fetch.index_lookup"):
+            product = index.get(barcode)
+        if product is not None:
+            # Already on local disk, so only the memory tier needs a copy
+            cache.memory.set(barcode, product)
+            return product
+
+    return inflight.do(barcode, _fetch_upstream, barcode)
+
+
+def _fetch_upstream(barcode, revalidate=False):
+    # One GET to Open Food Facts; the result is cached before coalesced callers see it.
+    # With revalidate the request is conditional on the cached copy's ETag/Last-Modified.
+    import requests
+
+    if not breaker.allow():
+        raise CircuitOpenError("Open Food Facts is unavailable, not retrying for now")
+    cache = get_product_cache()
+    headers = {}
+    if revalidate:
+        etag, last_modified = cache.validators(barcode)
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    try:
+        with instrumentation.span("fetch.http"):
+            res = get_session().get(product_url(barcode), params=PRODUCT_QUERY, headers=headers,
+                                    timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    except requests.RequestException as exc:
+        breaker.record_failure()
+        raise ProductAPIError(f"Request for {barcode} failed: {exc}") from exc
+    if res.status_code in RETRY_STATUSES:
+        breaker.record_failure()
+        raise ProductAPIError(f"Open Food Facts returned HTTP {res.status_code} for {barcode}")
+    if res.status_code == 304 and headers:
+        breaker.record_success()
+        product = cache.revalidate(barcode, res.headers.get("ETag"), res.headers.get("Last-Modified"))
+        if product is not MISS:
+            revalidator.count("not_modified")
+            return product
+        return _fetch_upstream(barcode)  # the cached copy went away meanwhile
+    if res.status_code != 200:
+        breaker.record_success()  # upstream is up; it just has nothing for this request
+        raise ProductAPIError(f"Open Food Facts returned HTTP {res.status_code} for {barcode}")
+
+    # A 200 only counts as a success once its body parsed: an HTML error page or a
+    # truncated document is a failure like a 5xx
+    try:
+        with instrumentation.span("fetch.json_parse"):
+            data = res.json()
+        product = Product.from_off(barcode, data["product"]) if data.get("status") == 1 else None
+    except (ValueError, KeyError, TypeError, AttributeError) as exc:
+        breaker.record_failure()
+        raise ProductAPIError(f"Open Food Facts sent a malformed response for {barcode}") from exc
+    breaker.record_success()
+    cache.set(barcode, product, res.headers.get("ETag"), res.headers.get("Last-Modified"))
+    if revalidate:
+        revalidator.count("updated")
+    return product
+
+
+def iter_products(barcodes):
+    # Looks barcodes up concurrently on the shared worker pool and yields
+    # (barcode, product, error) tuples in completion order, so callers can render
+    # results as they arrive. error is a ProductAPIError or None.
+    futures = {get_executor().submit(fetch_product, barcode): barcode for barcode in barcodes}
+    for future in as_completed(futures):
+        barcode = futures[future]
+        try:
+            yield barcode, future.result(), None
+        except ProductAPIError as exc:
+            yield barcode, None, exc
+
+
+# --- 7. STALE-WHILE-REVALIDATE ---
+# A cached product past its soft TTL is returned straight away, and schedule() queues
+# one conditional GET for it on the fetch pool: a 304 only restarts its TTLs, a 200
+# replaces it. Users therefore wait on upstream only for products never seen or past
+# the hard TTL. A barcode whose refresh failed is left alone for REVALIDATE_BACKOFF
+# seconds, so a flaky upstream is not asked again on every lookup.
+class Revalidator:
+    def __init__(self, backoff=REVALIDATE_BACKOFF):
+        self.backoff = backoff
+        self._pending = set()
+        self._failed_at = {}
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(("scheduled", "not_modified", "updated", "failed"), 0)
+
+    def schedule(self, barcode):
+        now = time.monotonic()
+        with self._lock:
+            if barcode in self._pending or now - self._failed_at.get(barcode, -self.backoff) < self.backoff:
+                return False
+            self._pending.add(barcode)
+            self._failed_at.pop(barcode, None)
+            self.counts["scheduled"] += 1
+        get_executor().submit(self._refresh, barcode)
+        return True
+
+    def _refresh(self, barcode):
+        try:
+            inflight.do(barcode, _fetch_upstream, barcode, True)
+        except ProductAPIError:
+            now = time.monotonic()
+            with self._lock:
+                self._failed_at = {key: at for key, at in self._failed_at.items() if now - at < self.backoff}
+                self._failed_at[barcode] = now
+                self.counts["failed"] += 1
+        finally:
+            with self._lock:
+                self._pending.discard(barcode)
+
+    def count(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            backing_off = sum(1 for at in self._failed_at.values() if time.monotonic() - at < self.backoff)
+            return {**self.counts, "in_flight": len(self._pending), "backing_off": backing_off}
+
+
+revalidator = Revalidator()
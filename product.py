@@ -0,0 +1,74 @@
+import json
+from dataclasses import dataclass
+
+# The only Open Food Facts fields the app reads. Lookups ask the API for just these
+# instead of the full product document (ingredients, images, nutriments, ...).
+OFF_FIELDS = (
+    "code",
+    "product_name",
+    "brands",
+    "categories",
+    "nutriscore_grade",
+    "image_front_url",
+    "carbon-footprint_100g",
+    "ecoscore_data",
+)
+
+
+@dataclass(frozen=True)
+class Product:
+    # Slim, immutable view of an Open Food Facts product. Values are kept as OFF sent
+    # them (None when missing), so the scoring helpers in ecoscan_core.py decide how to read them.
+    __slots__ = (
+        "barcode",
+        "product_name",
+        "brands",
+        "categories",
+        "nutriscore_grade",
+        "image_front_url",
+        "carbon_footprint_100g",
+        "agribalyse_co2_total",
+        "ecoscore_score",
+        "ecoscore_grade",
+    )
+    barcode: str
+    product_name: object
+    brands: object
+    categories: object
+    nutriscore_grade: object
+    image_front_url: object
+    carbon_footprint_100g: object
+    agribalyse_co2_total: object
+    ecoscore_score: object
+    ecoscore_grade: object
+
+    @classmethod
+    def from_off(cls, barcode, prod_data):
+        # Dumps and the API occasionally carry a string or list here instead of an object
+        ecoscore_data = prod_data.get("ecoscore_data")
+        ecoscore_data = ecoscore_data if isinstance(ecoscore_data, dict) else {}
+        agribalyse = ecoscore_data.get("agribalyse")
+        agribalyse = agribalyse if isinstance(agribalyse, dict) else {}
+        return cls(
+            barcode=barcode,
+            product_name=prod_data.get("product_name"),
+            brands=prod_data.get("brands"),
+            categories=prod_data.get("categories"),
+            nutriscore_grade=prod_data.get("nutriscore_grade"),
+            image_front_url=prod_data.get("image_front_url"),
+            carbon_footprint_100g=prod_data.get("carbon-footprint_100g"),
+            agribalyse_co2_total=agribalyse.get("co2_total"),
+            ecoscore_score=ecoscore_data.get("score"),
+            ecoscore_grade=ecoscore_data.get("grade"),
+        )
+
+    def to_json(self):
+        # Positional list in __slots__ order: about half the size of a keyed object
+        return json.dumps([getattr(self, name) for name in self.__slots__], separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, payload):
+        values = json.loads(payload)
+        if not isinstance(values, list) or len(values) != len(cls.__slots__):
+            raise ValueError("Not a serialized Product")
+        return cls(*values)
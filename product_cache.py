@@ -0,0 +1,322 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by every cache tier when a barcode is absent or expired. A stored value of
+# None is a valid hit: it is the negative-cache entry for a barcode that Open Food
+# Facts does not know (status != 1).
+MISS = object()
+
+# Besides its hard expiry every entry has a fresh_until time (its soft TTL). Past it the
+# entry is stale: still returned, but due a refresh. It defaults to the expiry, i.e.
+# the entry stays fresh until it expires.
+
+
+# --- 1. IN-PROCESS LRU TIER ---
+class LRUCache:
+    # soft_ttl (None: same as ttl) is when a value set without an explicit fresh_until
+    # goes stale; used when there is no disk tier to keep that time
+    def __init__(self, max_entries=1024, ttl=3600, negative_ttl=600, soft_ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.soft_ttl = ttl if soft_ttl is None else min(soft_ttl, ttl)
+        self._entries = OrderedDict()  # key -> (value, expires_at, fresh_until)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry if entry is MISS else entry[0]
+
+    def get_entry(self, key):
+        # (value, expires_at, fresh_until), or MISS
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            if entry[1] <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, value, expires_at=None, fresh_until=None):
+        now = time.time()
+        if expires_at is None:
+            expires_at = now + (self.ttl if value is not None else self.negative_ttl)
+        if fresh_until is None:
+            fresh_until = min(now + self.soft_ttl, expires_at) if value is not None else expires_at
+        with self._lock:
+            self._entries[key] = (value, expires_at, fresh_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def ttl_remaining(self, key):
+        # Seconds until key expires, None if absent; unlike get() this does not count
+        # as a hit or miss, nor refresh the key's LRU position
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        remaining = entry[1] - time.time()
+        return remaining if remaining > 0 else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+# --- 2. ON-DISK SQLITE TIER ---
+def _json_dumps(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+class DiskCache:
+    # encode/decode turn a cached value into a TEXT payload and back. A payload that no
+    # longer decodes (e.g. written by an older version of the app) is treated as a miss.
+    # soft_ttl (None: same as ttl) is when a stored value goes stale. The ETag and
+    # Last-Modified it came with are kept, so a refresh can be a conditional request.
+    # Several processes may share one file (see multiworker.py): it is opened in WAL
+    # mode, so readers never wait for a writer, and a writer waits up to busy_timeout
+    # seconds for another process's write to finish.
+    def __init__(self, path, ttl=7 * 24 * 3600, negative_ttl=24 * 3600, encode=_json_dumps, decode=json.loads,
+                 soft_ttl=None, busy_timeout=5.0):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.soft_ttl = ttl if soft_ttl is None else min(soft_ttl, ttl)
+        self.encode = encode
+        self.decode = decode
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")  # durable enough for a cache, and no fsync per write
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS products ("
+            " barcode TEXT PRIMARY KEY,"
+            " payload TEXT,"  # JSON product, NULL for a negative entry
+            " expires_at REAL NOT NULL,"
+            " fresh_until REAL,"
+            " etag TEXT,"
+            " last_modified TEXT)"
+        )
+        # Caches written before the soft TTL existed lack the last three columns; their
+        # rows get a NULL fresh_until, which reads as stale, so they refresh on next use
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(products)")}
+        for column, kind in (("fresh_until", "REAL"), ("etag", "TEXT"), ("last_modified", "TEXT")):
+            if column not in columns:
+                try:
+                    self._conn.execute(f"ALTER TABLE products ADD COLUMN {column} {kind}")
+                except sqlite3.OperationalError:
+                    pass  # another process sharing the file added it first
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+
+    def get(self, key):
+        # (value, expires_at, fresh_until), or (MISS, None, None)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, expires_at, fresh_until FROM products WHERE barcode = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return MISS, None, None
+            payload, expires_at, fresh_until = row
+            if expires_at <= time.time():
+                self._conn.execute("DELETE FROM products WHERE barcode = ?", (key,))
+                self._conn.commit()
+                self.expirations += 1
+                self.misses += 1
+                return MISS, None, None
+        value = self._decode(payload)
+        with self._lock:
+            if value is MISS:
+                self.misses += 1
+                return MISS, None, None
+            self.hits += 1
+        return value, expires_at, fresh_until or 0.0
+
+    def _decode(self, payload):
+        if payload is None:
+            return None
+        try:
+            return self.decode(payload)
+        except (TypeError, ValueError):
+            return MISS
+
+    def _lifetimes(self, value):
+        now = time.time()
+        if value is None:
+            expires_at = now + self.negative_ttl
+            return expires_at, expires_at
+        return now + self.ttl, now + self.soft_ttl
+
+    def set(self, key, value, etag=None, last_modified=None):
+        # Returns (expires_at, fresh_until) of the new entry
+        expires_at, fresh_until = self._lifetimes(value)
+        payload = self.encode(value) if value is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO products (barcode, payload, expires_at, fresh_until, etag, last_modified)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, payload, expires_at, fresh_until, etag, last_modified),
+            )
+            self._conn.commit()
+        return expires_at, fresh_until
+
+    def validators(self, key):
+        # (etag, last_modified) stored with key; either may be None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified FROM products WHERE barcode = ?", (key,)
+            ).fetchone()
+        return row if row is not None else (None, None)
+
+    def touch(self, key, etag=None, last_modified=None):
+        # Upstream confirmed the stored value is unchanged (HTTP 304): restart its TTLs
+        # without rewriting the payload. Same return as get(), but not counted as a hit.
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM products WHERE barcode = ?", (key,)).fetchone()
+            if row is None:
+                return MISS, None, None
+            expires_at, fresh_until = self._lifetimes(row[0])  # payload is NULL only for a negative entry
+            self._conn.execute(
+                "UPDATE products SET expires_at = ?, fresh_until = ?,"
+                " etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE barcode = ?",
+                (expires_at, fresh_until, etag, last_modified, key),
+            )
+            self._conn.commit()
+        value = self._decode(row[0])
+        if value is MISS:
+            return MISS, None, None
+        return value, expires_at, fresh_until
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM products WHERE barcode = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM products")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def stats(self):
+        return {
+            "entries": len(self),
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- 3. TIERED CACHE (MEMORY IN FRONT OF DISK) ---
+class TieredProductCache:
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, barcode):
+        entry = self.get_entry(barcode)
+        return entry if entry is MISS else entry[0]
+
+    def get_entry(self, barcode, skip_memory=False):
+        # (value, stale), or MISS. A stale value is past its soft TTL but not expired:
+        # fine to serve, but the caller should arrange a refresh. skip_memory reads the
+        # disk tier even if memory holds the key, replacing the memory copy on a hit.
+        entry = MISS if skip_memory else self.memory.get_entry(barcode)
+        if entry is MISS and self.disk is not None:
+            entry = self.disk.get(barcode)
+            if entry[0] is MISS:
+                return MISS
+            self._promote(barcode, *entry)
+        if entry is MISS:
+            return MISS
+        value, _, fresh_until = entry
+        return value, fresh_until <= time.time()
+
+    def _promote(self, barcode, value, expires_at, fresh_until):
+        # Copy a disk entry to memory, never beyond the expiry it already has
+        ttl = self.memory.ttl if value is not None else self.memory.negative_ttl
+        self.memory.set(barcode, value, expires_at=min(expires_at, time.time() + ttl), fresh_until=fresh_until)
+
+    def set(self, barcode, value, etag=None, last_modified=None):
+        if self.disk is None:
+            self.memory.set(barcode, value)
+            return
+        expires_at, fresh_until = self.disk.set(barcode, value, etag, last_modified)
+        self._promote(barcode, value, expires_at, fresh_until)
+
+    def validators(self, barcode):
+        return self.disk.validators(barcode) if self.disk is not None else (None, None)
+
+    def revalidate(self, barcode, etag=None, last_modified=None):
+        # Upstream answered 304 Not Modified: mark the stored value fresh again and
+        # return it, or MISS if it is no longer stored
+        if self.disk is None:
+            return MISS
+        value, expires_at, fresh_until = self.disk.touch(barcode, etag, last_modified)
+        if value is not MISS:
+            self._promote(barcode, value, expires_at, fresh_until)
+        return value
+
+    def delete(self, barcode):
+        self.memory.delete(barcode)
+        if self.disk is not None:
+            self.disk.delete(barcode)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
@@ -0,0 +1,289 @@
+"""Offline, barcode-keyed product index built from an Open Food Facts data dump.
+
+    python product_index.py build openfoodfacts-products.jsonl.gz products-index.sqlite3
+    python product_index.py lookup products-index.sqlite3 3017620429484
+
+    python product_index.py alternatives products-index.sqlite3 3017620429484
+
+The dump (JSONL or the tab-separated CSV export, optionally gzipped) is streamed one
+line at a time and written in batches, so memory stays flat however large it is.
+Set ECOSCAN_INDEX_PATH to the built file and off_client consults it before the API.
+
+Next to the products, the index keeps every product with a known carbon footprint
+under each of its categories, sorted by footprint, so "greener products in the same
+category" is a single range scan.
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from product import Product
+
+BATCH_SIZE = 10000
+ALTERNATIVES_LIMIT = 5
+
+
+# --- 1. STREAMING DUMP READERS ---
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    return open(path, "r", encoding="utf-8", errors="replace", newline="")
+
+
+def _iter_jsonl(path):
+    with _open_text(path) as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                doc = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(doc, dict):  # e.g. a stray list or number on its own line
+                continue
+            barcode = str(doc.get("code") or "").strip()
+            if barcode:
+                yield Product.from_off(barcode, doc)
+
+
+def _first(row, *columns):
+    for column in columns:
+        value = row.get(column)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _iter_csv(path):
+    # The OFF CSV export is tab-separated and has no Agribalyse breakdown, so only the
+    # direct carbon-footprint_100g column is available for the carbon fallback chain.
+    csv.field_size_limit(sys.maxsize)
+    with _open_text(path) as fh:
+        for row in csv.DictReader(fh, delimiter="\t"):
+            barcode = (row.get("code") or "").strip()
+            if not barcode:
+                continue
+            score = _first(row, "ecoscore_score", "environmental_score_score")
+            try:
+                score = int(float(score)) if score is not None else None
+            except (ValueError, OverflowError):  # "abc", or "inf"
+                score = None
+            yield Product(
+                barcode=barcode,
+                product_name=_first(row, "product_name"),
+                brands=_first(row, "brands"),
+                categories=_first(row, "categories", "categories_en"),
+                nutriscore_grade=_first(row, "nutriscore_grade"),
+                image_front_url=_first(row, "image_front_url", "image_url"),
+                carbon_footprint_100g=_first(row, "carbon-footprint_100g"),
+                agribalyse_co2_total=None,
+                ecoscore_score=score,
+                ecoscore_grade=_first(row, "ecoscore_grade", "environmental_score_grade"),
+            )
+
+
+def iter_dump(path):
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith((".csv", ".tsv")):
+        return _iter_csv(path)
+    return _iter_jsonl(path)
+
+
+# --- 2. INDEX BUILD ---
+def split_categories(categories):
+    # OFF lists categories broadest first ("Snacks, Sweet snacks, Biscuits"); returns them
+    # normalized and most specific first, the order alternatives are searched in
+    seen = []
+    for category in reversed((categories or "").split(",")):
+        category = category.strip().lower()
+        if category and category not in seen:
+            seen.append(category)
+    return seen
+
+
+def _write_batch(conn, batch):
+    # Products plus their (category, carbon) rows. Carbon uses the per-product helper:
+    # the batch arrives as Product objects, and turning it into a frame for scoring.py
+    # costs more than the scalar rule itself (see benchmarks/bench_scoring.py)
+    from ecoscan_core import _get_carbon_footprint
+
+    conn.executemany("INSERT OR REPLACE INTO products VALUES (?, ?)", [(p.barcode, p.to_json()) for p in batch])
+    rows = []
+    for product in batch:
+        carbon = _get_carbon_footprint(product)
+        if carbon is not None and carbon == carbon:  # NaN has no place in a carbon-ordered list
+            rows.extend((category, carbon, product.barcode) for category in split_categories(product.categories))
+    conn.executemany("INSERT OR REPLACE INTO alternatives VALUES (?, ?, ?)", rows)
+    return len(rows)
+
+
+def build_index(dump_path, index_path, batch_size=BATCH_SIZE, progress=None):
+    # Builds into a temporary file and swaps it in at the end, so a running app never
+    # sees a half-written index. Returns the number of products written.
+    tmp_path = index_path + ".building"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("CREATE TABLE products (barcode TEXT PRIMARY KEY, payload TEXT NOT NULL) WITHOUT ROWID")
+    # Clustered on (category, carbon): the rows of one category are stored in carbon order
+    conn.execute(
+        "CREATE TABLE alternatives (category TEXT NOT NULL, carbon_100g REAL NOT NULL, barcode TEXT NOT NULL,"
+        " PRIMARY KEY (category, carbon_100g, barcode)) WITHOUT ROWID"
+    )
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    count = 0
+    category_rows = 0
+    batch = []
+    for product in iter_dump(dump_path):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            category_rows += _write_batch(conn, batch)
+            conn.commit()
+            count += len(batch)
+            batch = []
+            if progress:
+                progress(count)
+    if batch:
+        category_rows += _write_batch(conn, batch)
+        count += len(batch)
+    conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+        ("source", os.path.basename(dump_path)),
+        ("built_at", str(time.time())),
+        ("products", str(count)),
+        ("category_rows", str(category_rows)),
+    ])
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, index_path)
+    return count
+
+
+# --- 3. READ-ONLY LOOKUPS ---
+class ProductIndex:
+    # Lookups are a primary-key B-tree probe, O(log n); opening the file reads nothing up front
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Indexes built before alternatives were added have no such table
+        self.has_alternatives = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alternatives'"
+        ).fetchone() is not None
+
+    def get(self, barcode):
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM products WHERE barcode = ?", (barcode,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return Product.from_json(row[0])
+
+    def alternatives(self, categories, below=None, limit=ALTERNATIVES_LIMIT, exclude=()):
+        # Lowest-carbon products sharing a category with `categories` (an OFF categories
+        # string), most specific category first, broader ones only to fill up `limit`.
+        # below: only products under this many g CO2e / 100 g. Returns [(category, carbon, Product)].
+        if not self.has_alternatives:
+            return []
+        found = []
+        seen = set(exclude)
+        for category in split_categories(categories):
+            query = ("SELECT a.barcode, a.carbon_100g, p.payload FROM alternatives a"
+                     " JOIN products p ON p.barcode = a.barcode WHERE a.category = ?")
+            params = [category]
+            if below is not None:
+                query += " AND a.carbon_100g < ?"
+                params.append(below)
+            query += " ORDER BY a.carbon_100g LIMIT ?"
+            params.append(limit + len(seen))  # enough to still fill up after skipping seen ones
+            with self._lock:
+                rows = self._conn.execute(query, params).fetchall()
+            for barcode, carbon, payload in rows:
+                if barcode not in seen:
+                    seen.add(barcode)
+                    found.append((category, carbon, Product.from_json(payload)))
+                    if len(found) >= limit:
+                        return found
+        return found
+
+    def iter_products(self, batch_size=BATCH_SIZE):
+        # Streams every indexed product in barcode order, e.g. into scoring.products_to_frame
+        cursor = self._conn.cursor()
+        cursor.execute("SELECT payload FROM products ORDER BY barcode")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for (payload,) in rows:
+                yield Product.from_json(payload)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def meta(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def stats(self):
+        return {"path": self.path, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- 4. COMMAND LINE ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the offline Open Food Facts product index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="stream a JSONL/CSV dump (optionally .gz) into an index")
+    build_parser.add_argument("dump")
+    build_parser.add_argument("index")
+    build_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    lookup_parser = subparsers.add_parser("lookup", help="print the indexed record for a barcode")
+    lookup_parser.add_argument("index")
+    lookup_parser.add_argument("barcode")
+    alternatives_parser = subparsers.add_parser("alternatives", help="list greener products in the same categories")
+    alternatives_parser.add_argument("index")
+    alternatives_parser.add_argument("barcode")
+    alternatives_parser.add_argument("--limit", type=int, default=ALTERNATIVES_LIMIT)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        count = build_index(args.dump, args.index, args.batch_size,
+                            progress=lambda n: print(f"\r{n:,} products indexed", end="", file=sys.stderr))
+        elapsed = time.perf_counter() - start
+        print(f"\rIndexed {count:,} products into {args.index} in {elapsed:.1f}s", file=sys.stderr)
+    else:
+        index = ProductIndex(args.index)
+        product = index.get(args.barcode)
+        if product is None:
+            print(f"{args.barcode} is not in the index", file=sys.stderr)
+            return 1
+        if args.command == "lookup":
+            print(json.dumps({name: getattr(product, name) for name in Product.__slots__}, indent=2))
+            return 0
+        from ecoscan_core import _get_carbon_footprint
+        below = _get_carbon_footprint(product)
+        for category, value, alternative in index.alternatives(product.categories, below, args.limit, exclude={args.barcode}):
+            print(f"{value:8.1f} g CO2e/100g  {alternative.barcode}  {alternative.product_name or ''}  [{category}]")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
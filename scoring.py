@@ -0,0 +1,137 @@
+"""Batch versions of the scoring helpers in ecoscan_core.py, as column operations over a frame.
+
+Each output column matches what `_get_carbon_footprint`, `_get_ecoscore` and
+`_get_eco_grade_details` return for the same product, row by row
+(benchmarks/bench_scoring.py checks this and measures the speedup).
+"""
+import numpy as np
+import pandas as pd
+
+# Input columns, named after the Product fields they come from
+SCORING_COLUMNS = ("carbon_footprint_100g", "agribalyse_co2_total", "ecoscore_score", "ecoscore_grade")
+
+# Grade letter index -> (display, colour, icon); same table as _get_eco_grade_details
+GRADE_LETTERS = ["A", "B", "C", "D", "E"]
+GRADE_DISPLAY = ["A (Excellent)", "B (Good)", "C (Average)", "D (Poor)", "E (Dangerous)"]
+GRADE_COLOR = ["green", "lightgreen", "orange", "darkorange", "red"]
+GRADE_ICON = ["🌳", "🌿", "🌱", "⚠️", "☠️"]
+# Green score band edges: >= 80 is A, >= 60 is B, ... below 20 is E
+GREEN_SCORE_BANDS = np.array([20, 40, 60, 80])
+_GRADE_INDEX = {**{letter: i for i, letter in enumerate(GRADE_LETTERS)},
+                **{letter.lower(): i for i, letter in enumerate(GRADE_LETTERS)}}
+
+
+# --- 1. FRAME CONSTRUCTION ---
+def _float_or_nan(value):
+    # float() as the scalar helpers apply it, with NaN for "skip this value"
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _parsed_or_none(value):
+    # float() as the scalar helpers apply it, with None for "skip this value"
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _carbon_columns(name, raw):
+    # A float64 column plus a "<name>_ok" mask of the values float() accepted. NaN alone
+    # can not say "skip": a value that really is NaN ("nan") is kept by the scalar helper.
+    parsed = [_parsed_or_none(value) for value in raw]
+    return {
+        name: np.array([np.nan if value is None else value for value in parsed], dtype=float),
+        name + "_ok": np.array([value is not None for value in parsed], dtype=bool),
+    }
+
+
+def products_to_frame(products):
+    # Numeric fields are parsed once here into float64 columns (NaN = missing or
+    # unparseable), so scoring itself is pure array arithmetic.
+    barcodes, direct, agribalyse, scores, grades = [], [], [], [], []
+    for product in products:
+        barcodes.append(product.barcode)
+        direct.append(product.carbon_footprint_100g)
+        agribalyse.append(product.agribalyse_co2_total)
+        scores.append(_float_or_nan(product.ecoscore_score))
+        grades.append(product.ecoscore_grade)
+    return pd.DataFrame({
+        "barcode": pd.Series(barcodes, dtype=object),
+        **_carbon_columns("carbon_footprint_100g", direct),
+        **_carbon_columns("agribalyse_co2_total", agribalyse),
+        "ecoscore_score": np.array(scores, dtype=float),
+        "ecoscore_grade": pd.Categorical(grades),  # a handful of distinct values, so mapping is per category
+    })
+
+
+# --- 2. VECTORIZED HELPERS ---
+def _parse_floats(frame, name):
+    # Vectorized `float(value)`: returns (values, ok), ok being False where the scalar
+    # code would skip the value (None, or float() raising). Columns parsed already (as
+    # products_to_frame builds them) come with their "<name>_ok" mask; other float
+    # columns take NaN as missing; raw object columns, e.g. read straight from a dump,
+    # are parsed here.
+    column = frame[name]
+    if name + "_ok" in frame:
+        return column.to_numpy(dtype=float), frame[name + "_ok"].to_numpy(dtype=bool)
+    if column.dtype.kind in "fiub":
+        values = column.to_numpy(dtype=float)
+        return values, ~np.isnan(values)
+    raw = column.to_numpy(dtype=object)
+    present = raw != None  # noqa: E711 - elementwise test on an object array
+    values = pd.to_numeric(column, errors="coerce").to_numpy(dtype=float, copy=True)
+    ok = present & ~np.isnan(values)
+    # Whatever pandas would not parse (e.g. "1_000", or a real NaN) goes through float() itself
+    for i in np.flatnonzero(present & ~ok):
+        try:
+            values[i] = float(raw[i])
+            ok[i] = True
+        except (TypeError, ValueError):
+            pass
+    return values, ok
+
+
+def carbon_footprint(frame):
+    # Returns (grams CO2e per 100 g, has_value); Agribalyse co2_total is per kg, hence * 100
+    direct, direct_ok = _parse_floats(frame, "carbon_footprint_100g")
+    agribalyse, agribalyse_ok = _parse_floats(frame, "agribalyse_co2_total")
+    carbon = np.where(direct_ok, direct, np.where(agribalyse_ok, agribalyse * 100, np.nan))
+    return carbon, direct_ok | agribalyse_ok
+
+
+def grade_index(frame):
+    # Index into GRADE_LETTERS: the ecoscore grade when it is A-E, else banded green score
+    score_column = frame["ecoscore_score"]
+    green_score = pd.to_numeric(score_column, errors="coerce").fillna(0).to_numpy(dtype=float)
+    from_grade = frame["ecoscore_grade"].map(_GRADE_INDEX).to_numpy(dtype=float)
+    from_score = len(GREEN_SCORE_BANDS) - np.searchsorted(GREEN_SCORE_BANDS, green_score, side="right")
+    return np.where(np.isnan(from_grade), from_score, from_grade).astype(np.int8), green_score
+
+
+# --- 3. BATCH SCORING ---
+def score_frame(frame):
+    # frame needs the SCORING_COLUMNS; returns a new frame with the scores appended
+    carbon, has_carbon = carbon_footprint(frame)
+    grades, green_score = grade_index(frame)
+    scored = frame.copy()
+    scored["carbon_footprint_100g_value"] = carbon
+    scored["has_carbon_footprint"] = has_carbon
+    scored["green_score"] = green_score
+    # Categoricals over the five grades: no per-row string objects are created
+    scored["eco_grade"] = pd.Categorical.from_codes(grades, GRADE_LETTERS)
+    scored["eco_grade_display"] = pd.Categorical.from_codes(grades, GRADE_DISPLAY)
+    scored["grade_color"] = pd.Categorical.from_codes(grades, GRADE_COLOR)
+    scored["grade_icon"] = pd.Categorical.from_codes(grades, GRADE_ICON)
+    return scored
+
+
+def score_products(products):
+    return score_frame(products_to_frame(products))
+
@@ -0,0 +1,163 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from product import Product
+
+# --- 1. CONFIGURATION ---
+# Most a single Streamlit session may keep in its memos; beyond it the memos are dropped
+# (cheapest to rebuild first) and recomputed when next needed
+SESSION_MAX_BYTES = int(os.environ.get("ECOSCAN_SESSION_MAX_BYTES", str(512 * 1024)))
+# Process-wide budget for generated reports and downloads shared by all sessions
+SHARED_BLOB_BYTES = int(os.environ.get("ECOSCAN_SHARED_BLOB_BYTES", str(64 * 1024 * 1024)))
+
+
+# --- 2. SIZE ESTIMATE ---
+def approx_size(obj, _seen=None):
+    # Deep sys.getsizeof of obj and everything it holds, each object counted once.
+    # Products are shared with the product cache rather than owned, so they count as 0.
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen or isinstance(obj, Product):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(key, seen) + approx_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item, seen) for item in obj)
+    return size
+
+
+# --- 3. SHARED BLOBS ---
+# Generated bytes (PDF reports, result CSVs) live here once per process instead of in
+# every session that asked for them. Sessions keep only the key; under memory pressure
+# the least recently used blobs are evicted, and get() then returns None.
+class SharedBlobs:
+    def __init__(self, max_bytes=SHARED_BLOB_BYTES):
+        self.max_bytes = max_bytes
+        self._blobs = OrderedDict()  # key -> bytes or str
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            blob = self._blobs.get(key)
+            if blob is None:
+                self.misses += 1
+                return None
+            self._blobs.move_to_end(key)
+            self.hits += 1
+            return blob
+
+    def put(self, key, blob):
+        size = len(blob)
+        with self._lock:
+            old = self._blobs.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            if size > self.max_bytes:
+                return blob  # would evict everything else; handed back but not kept
+            self._blobs[key] = blob
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._blobs.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+        return blob
+
+    def get_or_create(self, key, factory):
+        # Two sessions racing on the same key may both run factory; the result is the same
+        blob = self.get(key)
+        return blob if blob is not None else self.put(key, factory())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._blobs),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+shared_blobs = SharedBlobs()
+
+
+# --- 4. PER-SESSION BUDGET AND REPORT ---
+def enforce_budget(state, keys, max_bytes=SESSION_MAX_BYTES):
+    # Sets state[key] to None, in the order of keys, until the memos under keys fit in
+    # max_bytes. Returns ({key: bytes} measured before, [keys dropped]).
+    sizes = {key: approx_size(state[key]) if state.get(key) is not None else 0 for key in keys}
+    total = sum(sizes.values())
+    dropped = []
+    for key in keys:
+        if total <= max_bytes:
+            break
+        if sizes[key]:
+            state[key] = None
+            total -= sizes[key]
+            dropped.append(key)
+    return sizes, dropped
+
+
+class SessionRegistry:
+    # What each session held after its last rerun. Sessions only change when they rerun,
+    # so this stays accurate for idle ones. is_active(session_id) tells closed sessions
+    # apart; they are forgotten every PRUNE_EVERY records and on every report.
+    PRUNE_EVERY = 256
+
+    def __init__(self):
+        self._sessions = {}  # session id -> (updated_at, {key: bytes})
+        self._lock = threading.Lock()
+        self.records = 0
+        self.budget_drops = 0
+
+    def _prune_locked(self, is_active):
+        if is_active is not None:
+            for session_id in [sid for sid in self._sessions if not is_active(sid)]:
+                del self._sessions[session_id]
+
+    def record(self, session_id, sizes, dropped=(), is_active=None):
+        with self._lock:
+            self._sessions[session_id] = (time.time(), dict(sizes))
+            self.records += 1
+            self.budget_drops += len(dropped)
+            if self.records % self.PRUNE_EVERY == 0:
+                self._prune_locked(is_active)
+
+    def report(self, is_active=None, top_n=10):
+        with self._lock:
+            self._prune_locked(is_active)
+            sessions = sorted(
+                ({"session": sid[:8], "bytes": sum(sizes.values()), "memos": sizes, "updated_at": round(at)}
+                 for sid, (at, sizes) in self._sessions.items()),
+                key=lambda entry: entry["bytes"], reverse=True,
+            )
+            return {
+                "process_rss_bytes": process_rss(),
+                "sessions": len(sessions),
+                "session_bytes_total": sum(entry["bytes"] for entry in sessions),
+                "session_max_bytes": SESSION_MAX_BYTES,
+                "budget_drops": self.budget_drops,
+                "largest_sessions": sessions[:top_n],
+                "shared_blobs": shared_blobs.stats(),
+            }
+
+
+sessions = SessionRegistry()
+
+
+def process_rss():
+    # Resident set size in bytes where the platform exposes it (Linux), else None
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
@@ -0,0 +1,134 @@
+import re
+
+# Page CSS for app.py. It lives in an imported module so it is minified once per
+# process; app.py itself is re-executed by Streamlit on every rerun.
+_CUSTOM_CSS = """
+/* 1. Overall Page & App Container: Ensure no page-level scrolling */
+html, body, .stApp {
+    height: 100vh; /* Make it fill the entire viewport height */
+    width: 100vw;  /* Make it fill the entire viewport width */
+    margin: 0;
+    padding: 0;
+    overflow: hidden; /* CRUCIAL: Prevents scrollbars on the html/body/main app itself */
+    display: flex;
+    flex-direction: column; /* Stack children vertically */
+}
+
+/* Hide Streamlit default header/footer if any, to reclaim space */
+header, footer {
+    visibility: hidden;
+    height: 0;
+    margin: 0;
+    padding: 0;
+}
+
+/* 2. Main Content Block: The area after the title, before the tab content */
+.block-container {
+    flex-grow: 1; /* Allow it to take all remaining vertical space within .stApp */
+    height: 100%; /* IMPORTANT: It needs a defined height for its flex children */
+    max-width: 95vw; /* Keep consistent width constraint */
+    overflow: hidden; /* No scrolling for this main block either */
+    display: flex;
+    flex-direction: column; /* Stack title, tabs, and tab-content area */
+    padding-top: 0.5rem; /* Reduced top padding */
+}
+
+/* Adjust title and tabs to take their space without growing/shrinking */
+h1 {
+    margin: 0px; /* Remove default margins */
+    flex-shrink: 0;
+    # padding-bottom: 0.5rem; /* Add some space below title */
+}
+[data-testid="stTabs"] {
+    flex-shrink: 0;
+    margin-bottom: 0; /* Adjust margin below tabs */
+}
+
+/* 3. Tab Panel Content: The area inside the selected tab (contains the columns) */
+div[role="tabpanel"] {
+    flex-grow: 1; /* Make tab content fill remaining height within block-container */
+    height: 100%; /* IMPORTANT: Must have defined height for its column children */
+    display: flex; /* Make it a flex container for the columns */
+    flex-direction: row; /* Layout columns horizontally */
+    overflow: hidden; /* No scrolling for the tab panel itself */
+    padding: 0 1rem; /* Adjust horizontal padding */
+}
+
+/* 4. Streamlit Columns: Ensure columns take full height and are flex containers */
+[data-testid="stColumn"] {
+    display: flex;
+    flex-direction: column; /* Stack content within columns vertically */
+    flex-grow: 1; /* Allow columns to expand to fill horizontal space */
+    height: 100%; /* IMPORTANT: Makes column take full height of its tabpanel parent */
+    overflow: hidden; /* No scrolling for the column container itself */
+}
+
+/* 5. CRUCIAL: The actual scrollable content block within the RIGHT column */
+/* This targets the `stVerticalBlock` div, which is the direct parent of your st.elements
+   within each column. We want *this* element to scroll if its content overflows. */
+[data-testid="stColumn"]:nth-of-type(2) > div:first-child > [data-testid="stVerticalBlock"] {
+    flex-grow: 1; /* Allow this content block to take available vertical space */
+    overflow-y: auto; /* FINALLY, make THIS area scrollable */
+    padding-right: 1rem; /* Add padding for scrollbar visibility */
+    padding-left: 1rem; /* Add some left padding to match general UI */
+    min-height: 0; /* Essential for flex-grow to work correctly with overflow:auto */
+}
+/* Adjust padding/margin for `stVerticalBlock` within the left column as well, if needed */
+[data-testid="stColumn"]:nth-of-type(1) > div:first-child > [data-testid="stVerticalBlock"] {
+    padding-right: 1rem;
+    padding-left: 1rem;
+}
+
+
+/* Adjust Plotly charts to fill available space without causing overflow */
+.stPlotlyChart {
+    height: auto !important; /* Allow plotly chart to determine its height based on content */
+    max-height: 400px; /* Set a maximum height to prevent excessively tall charts */
+    min-height: 250px; /* Ensure a minimum size for visibility */
+    width: 100% !important; /* Fill parent width */
+    margin: 0px !important; /* Remove all default margins around the chart */
+    padding: 0px !important; /* Remove all default paddings around the chart */
+    border: 1px solid #e0e0e0; /* Add a subtle border to the chart */
+    border-radius: 5px; /* Slightly rounded corners for the border */
+}
+
+/* Adjust margins/padding for various Streamlit elements for a tighter layout */
+.stMarkdown, .stSubheader, .stTextInput, .stFileUploader, .stSelectbox,
+.stButton, .stMetric, .stProgress, .stSuccess, .stInfo, .stWarning, .stError,
+div[data-testid="stHorizontalBlock"] {
+    margin-bottom: 0.2rem !important; /* Reduced margin */
+    margin-top: 0.2rem !important;    /* Reduced margin */
+    padding-top: 0.2rem !important;   /* Reduced padding */
+    padding-bottom: 0.2rem !important;/* Reduced padding */
+}
+
+/* Specific adjustment for subheaders to control space */
+.stSubheader {
+    margin-top: 0.5rem !important; /* Slightly more space above subheaders */
+    margin-bottom: 0.2rem !important; /* Less space below subheaders */
+}
+
+/* Specific adjustment for the HR line (st.write("---")) */
+hr {
+    margin-top: 0.3rem !important; /* Reduce space above HR */
+    margin-bottom: 0.3rem !important; /* Reduce space below HR */
+    border-top: 1px solid #eee; /* Lighten HR line if needed */
+}
+
+/* Adjust spacing for metrics */
+div[data-testid="stMetric"] {
+    padding: 0.5rem !important;
+    margin-bottom: 0.5rem !important;
+}
+"""
+
+
+def _minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)  # comments
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+CUSTOM_CSS_HTML = f"<style>{_minify_css(_CUSTOM_CSS)}</style>"
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+
+import instrumentation
+import off_client
+from off_client import CircuitOpenError, ProductAPIError, fetch_product, get_executor, get_product_cache
+
+# --- 1. CONFIGURATION ---
+# Extra barcodes to keep warm, comma or whitespace separated
+WARMUP_BARCODES = os.environ.get("ECOSCAN_WARMUP_BARCODES", "").replace(",", " ").split()
+WARMUP_INTERVAL = float(os.environ.get("ECOSCAN_WARMUP_INTERVAL", "900"))  # seconds between runs, 0 = startup only
+WARMUP_TOP_N = int(os.environ.get("ECOSCAN_WARMUP_TOP_N", "50"))  # most looked-up barcodes added from the access log
+WARMUP_WINDOW = float(os.environ.get("ECOSCAN_WARMUP_WINDOW", str(7 * 24 * 3600)))  # how far back "recent" reaches
+# Prefetches in flight at once; the rest of the fetch pool stays free for user lookups
+WARMUP_CONCURRENCY = int(os.environ.get("ECOSCAN_WARMUP_CONCURRENCY", "4"))
+WARMUP_ENABLED = os.environ.get("ECOSCAN_WARMUP", "1") != "0"
+
+
+# --- 2. WARMER ---
+# Keeps a list of hot barcodes in the in-process cache: the pinned ones given at start
+# plus the top-N from the access log. A barcode is refetched when it is missing from
+# memory or would expire before the next run; anything still on disk is promoted from
+# there without touching the network.
+class Warmer:
+    def __init__(self, pinned=(), interval=WARMUP_INTERVAL, top_n=WARMUP_TOP_N,
+                 window=WARMUP_WINDOW, concurrency=WARMUP_CONCURRENCY):
+        self.pinned = list(dict.fromkeys(pinned))
+        self.interval = interval
+        self.top_n = top_n
+        self.window = window
+        self.concurrency = max(1, concurrency)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.last_run = None
+
+    def hot_barcodes(self):
+        off_client.access_log.flush()
+        popular = off_client.access_log.top(self.top_n, self.window) if self.top_n else []
+        return list(dict.fromkeys(self.pinned + popular))
+
+    def _needs_fetch(self, barcode):
+        remaining = get_product_cache().memory.ttl_remaining(barcode)
+        return remaining is None or remaining < self.interval
+
+    def run_once(self):
+        start = time.perf_counter()
+        hot = self.hot_barcodes()
+        stale = [barcode for barcode in hot if self._needs_fetch(barcode)]
+        warmed, failed, aborted = 0, 0, False
+        with instrumentation.span("warmup.run"):
+            for offset in range(0, len(stale), self.concurrency):
+                chunk = stale[offset:offset + self.concurrency]
+                # About to expire: reload from disk or upstream now, keeping the memory copy until that worked
+                futures = [get_executor().submit(fetch_product, barcode, False, True) for barcode in chunk]
+                for future in futures:
+                    try:
+                        future.result()
+                        warmed += 1
+                    except CircuitOpenError:
+                        aborted = True
+                    except ProductAPIError:
+                        failed += 1
+                if aborted or self._stop.is_set():
+                    break  # upstream is down or we are shutting down; the next run picks it up
+        with self._lock:
+            self.runs += 1
+            self.last_run = {
+                "finished_at": time.time(),
+                "hot": len(hot),
+                "already_warm": len(hot) - len(stale),
+                "warmed": warmed,
+                "failed": failed,
+                "aborted": aborted,
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+        return self.last_run
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception:  # a broken run must not end the schedule
+                pass
+            if self.interval <= 0 or self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="ecoscan-warmup", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pinned": len(self.pinned),
+                "interval": self.interval,
+                "runs": self.runs,
+                "last_run": self.last_run,
+                "running": self._thread is not None and self._thread.is_alive(),
+            }
+
+
+# --- 3. PROCESS-WIDE WARMER ---
+# Started once per process (Streamlit reruns and API startup both call start_warmup);
+# the first run happens on a daemon thread, so it never delays a page render.
+_warmer = None
+_warmer_lock = threading.Lock()
+
+
+def start_warmup(pinned=()):
+    global _warmer
+    if not WARMUP_ENABLED:
+        return None
+    if _warmer is None:
+        with _warmer_lock:
+            if _warmer is None:
+                _warmer = Warmer(list(pinned) + WARMUP_BARCODES).start()
+    return _warmer
+
+
+def warmup_stats():
+    return _warmer.stats() if _warmer is not None else None